@@ -0,0 +1,193 @@
+"""
+Indexes that let the agents pick a bandit without scanning all of them.
+
+With tens of thousands of bandits, scanning every one on every step is most
+of an agent's time. Each step only changes one bandit, though, so the best
+bandit can be kept track of instead:
+
+    GreedyIndex     for QAgent: the bandits with the highest Q-value in each
+                    state. It picks uniformly among tied bandits, like
+                    QAgent.greedy, in O(log K) per step.
+    ThompsonIndex   for TSTDAgent: the bandit whose posterior sample has the
+                    least regret. It needs samples that are kept between
+                    steps (the 'changed', 'interval' and 'episode' resampling
+                    policies), and finds the same bandit as a full scan by
+                    reading only the heads of the samples sorted by action.
+"""
+import heapq
+import numpy as np
+
+# Regret bounds are loosened by this much, so rounding never prunes the best
+# bandit
+BOUND_SLACK = 1e-9
+
+class GreedyIndex(object):
+    """
+    The highest Q-values of every state. Bandits that have never been
+    updated in a state all still hold the initial value, so they are kept as
+    one group, in a swap array that supports O(1) removal and uniform picks.
+    The bandits that have been updated are kept in a lazy max-heap per state,
+    along with the list of those tied for its top value.
+    """
+    def __init__(self, num_states, num_bandits, initial = 0):
+        self.num_bandits = num_bandits
+        self.initial = initial
+        # Per state, created on the state's first update: fresh[:count] are
+        # the bandits never updated, and position[k] is where k is in fresh
+        self.fresh = [None] * num_states
+        self.position = [None] * num_states
+        self.count = np.full(num_states, num_bandits, dtype=int)
+        self.heap = [[] for s in range(num_states)]
+        self.top = np.full(num_states, -np.inf)
+        self.ties = [[] for s in range(num_states)]
+
+    def greedy(self, q, state, rng):
+        """
+        Returns (bandit, value) for a uniformly random one of the bandits with
+        the highest Q-value in state, where q is that state's row of values.
+        Like a full scan, it only draws from rng when there is a tie.
+        """
+        top = self.top[state]
+        fresh = self.count[state] if self.initial >= top else 0
+        ties = self.ties[state] if top >= self.initial or fresh == 0 else []
+        n = fresh + len(ties)
+        i = rng.randint(n) if n > 1 else 0
+        if i < len(ties):
+            bandit = ties[i]
+        elif self.fresh[state] is None:
+            bandit = i - len(ties)
+        else:
+            bandit = self.fresh[state][i - len(ties)]
+        return (bandit, q[bandit])
+
+    def update(self, q, state, bandit):
+        """
+        Records that q[bandit] (the state's row of values) has changed.
+        """
+        if self.fresh[state] is None:
+            self.fresh[state] = np.arange(self.num_bandits)
+            self.position[state] = np.arange(self.num_bandits)
+        (fresh, position) = (self.fresh[state], self.position[state])
+        if position[bandit] < self.count[state]:
+            # Swap it out of the never-updated group
+            last = self.count[state] - 1
+            moved = fresh[last]
+            (fresh[position[bandit]], fresh[last]) = (moved, bandit)
+            (position[moved], position[bandit]) = (position[bandit], last)
+            self.count[state] = last
+        ties = self.ties[state]
+        if bandit in ties:
+            ties.remove(bandit)
+        value = q[bandit]
+        heap = self.heap[state]
+        heapq.heappush(heap, (-value, bandit))
+        if value > self.top[state]:
+            self.top[state] = value
+            self.ties[state] = [bandit]
+        elif value == self.top[state]:
+            ties.append(bandit)
+        elif not ties:
+            self.find_top(q, state)
+        if len(heap) > 2 * (self.num_bandits - self.count[state]) + 16:
+            # Drop the stale entries
+            heap[:] = [(-q[k], k) for k in fresh[self.count[state]:]]
+            heapq.heapify(heap)
+
+    def find_top(self, q, state):
+        """
+        Finds the top value of the updated bandits, and every bandit tied
+        for it, once the last of the previous ties has dropped.
+        """
+        heap = self.heap[state]
+        # An entry is stale once its bandit's value has moved on
+        while heap and q[heap[0][1]] != -heap[0][0]:
+            heapq.heappop(heap)
+        if not heap:
+            self.top[state] = -np.inf
+            self.ties[state] = []
+            return
+        top = -heap[0][0]
+        entries = []
+        while heap and -heap[0][0] == top:
+            entries.append(heapq.heappop(heap))
+        for entry in entries:
+            heapq.heappush(heap, entry)
+        self.top[state] = top
+        self.ties[state] = sorted(set(k for (v, k) in entries if q[k] == top))
+
+class ThompsonIndex(object):
+    """
+    The posterior samples of every bandit, sorted by the probability of each
+    action. A state's action gaps are never negative, and one of them, the
+    free action's, is zero, so a sample's regret is at least
+
+        gap[worst] * P(worst)           and      gap[third] * (1 - P(free))
+
+    where worst is the action with the largest gap. A probe of the samples
+    least likely to take worst and most likely to take free gives a regret to
+    beat, and only the bandits at the head of one sorted list can beat it:
+    those whose P(worst) or P(free) gets under that bound, whichever are
+    fewer. Bandits resampled since the lists were sorted are always checked.
+    """
+    def __init__(self, num_bandits, probe = 32):
+        self.probe = probe
+        self.samples = None
+        self.stale = np.zeros(num_bandits, dtype=bool)
+        self.changed_bandits = np.zeros(num_bandits, dtype=int)
+        self.num_changed = 0
+
+    def rebuild(self, samples):
+        """
+        Sorts a new set of samples. The index keeps a reference to the array
+        and reads rows from it as they change.
+        """
+        self.samples = samples
+        self.order = np.argsort(samples, axis=0)
+        self.sorted = samples[self.order, np.arange(samples.shape[1])]
+        self.stale[:] = False
+        self.num_changed = 0
+
+    def changed(self, bandit):
+        """
+        Records that a bandit's sample has been redrawn in place.
+        """
+        if not self.stale[bandit]:
+            self.stale[bandit] = True
+            self.changed_bandits[self.num_changed] = bandit
+            self.num_changed += 1
+
+    def best(self, gap):
+        """
+        Returns the bandit whose sample has the least regret given the
+        state's action gaps. That is the bandit argmin over every sample
+        picks, but for exact ties, which continuous samples almost never
+        have.
+        """
+        if not gap.any():
+            # Every bandit has zero regret
+            return 0
+        (free, worst) = (gap.argmin(), gap.argmax())
+        third = 3 - free - worst
+        changed = self.changed_bandits[:self.num_changed]
+        probe = np.concatenate((changed, self.order[-self.probe:, free], self.order[:self.probe, worst]))
+        best = self.scan(probe, gap)
+        bound = best[0] + BOUND_SLACK
+        # The sorted samples of changed bandits are out of date, but those
+        # bandits are in the probe
+        fewest = np.searchsorted(self.sorted[:, worst], bound / gap[worst], 'right')
+        members = self.order[:fewest, worst]
+        if gap[third] > 0:
+            most = np.searchsorted(self.sorted[:, free], 1 - bound / gap[third], 'left')
+            if len(self.order) - most < fewest:
+                members = self.order[most:, free]
+        if len(members):
+            best = min(best, self.scan(members, gap))
+        return best[1]
+
+    def scan(self, members, gap):
+        """
+        Returns (regret, bandit) for the least regret among members.
+        """
+        regret = self.samples.take(members, axis=0).dot(gap)
+        i = regret.argmin()
+        return (regret[i], members[i])
@@ -0,0 +1,156 @@
+"""
+Throughput benchmarks for the grid world agents.
+
+Each case plays one agent for a fixed number of episodes against a fixed,
+seeded world, and reports episodes/sec, steps/sec and the peak resident
+memory of the process. Every case runs in a fresh worker process, so peak
+memory is not polluted by earlier cases. The 'random' agent picks bandits
+uniformly at random and does no learning, which gives the cost of the
+environment loop on its own.
+
+Each case also reports its mean regret per episode against the optimal
+policy (see oracle.py), so variants that trade accuracy for speed, like
+TSTD(0)'s resampling policies, show what they give up.
+
+The -index variants pick bandits through banditindex.py rather than a scan
+of every bandit; their gains show at thousands of bandits:
+
+    python bench.py --agents tstd-changed tstd-index qlearning qlearning-index --bandits 1000 10000 100000
+
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json
+
+In compare mode, a case is flagged as a regression when its steps/sec drops,
+or its peak memory grows, by more than --threshold.
+"""
+import sys
+import json
+import time
+import resource
+import argparse
+import multiprocessing
+from gridworld import *
+import qlearning
+import tstd
+import oracle
+
+# TSTD(0) variants and the constructor arguments that make them
+TSTD_VARIANTS = {'tstd-sweep': {'planning': 'sweep'},
+                 'tstd-step': {'resample': 'step'},
+                 'tstd-changed': {'resample': 'changed'},
+                 'tstd-interval': {'resample': 'interval', 'resample_every': 10},
+                 'tstd-episode': {'resample': 'episode'},
+                 'tstd-index': {'resample': 'changed', 'resample_every': 1000, 'index': True}}
+AGENTS = ['random', 'tstd'] + sorted(TSTD_VARIANTS) + ['qlearning', 'qlearning-index']
+BANDITS = [2, 3, 5, 10, 20, 50, 100]
+GRIDS = ['4x3', '10x10']
+
+class RandomAgent(Agent):
+    """
+    An agent that picks bandits uniformly at random and never learns.
+    """
+    def get_bandit(self):
+        return self.rng.randint(self.num_bandits)
+
+def make_agent(name, bandits, layout, rng):
+    if name == 'random':
+        return RandomAgent(bandits, layout, rng)
+    if name == 'tstd':
+        return tstd.TSTDAgent(bandits, layout = layout, rng = rng)
+    if name in TSTD_VARIANTS:
+        return tstd.TSTDAgent(bandits, layout = layout, rng = rng, **TSTD_VARIANTS[name])
+    if name == 'qlearning':
+        return qlearning.QAgent(bandits, layout = layout, rng = rng)
+    if name == 'qlearning-index':
+        return qlearning.QAgent(bandits, layout = layout, rng = rng, index = True)
+    raise ValueError('Unknown agent: {0}'.format(name))
+
+def run_case(case):
+    """
+    Times one case. The same seeded run is repeated and the fastest repeat
+    is kept, since slower ones only measure interference from the machine.
+    """
+    (name, bandits, grid, episodes, seed, repeat) = case
+    (width, height) = [int(x) for x in grid.split('x')]
+    layout = build_layout(width, height)
+    seconds = None
+    for _ in range(repeat):
+        agent = make_agent(name, bandits, layout, make_rng(seed, AGENT_STREAM, 0))
+        world = GridWorld(num_bandits = bandits, agent = agent, layout = layout, seed = seed)
+        steps = 0
+        score = 0
+        start = time.time()
+        for ep in range(episodes):
+            score += world.play_episode()
+            steps += world.moves
+        elapsed = time.time() - start
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    regret = oracle.optimal_value(world) - float(score) / episodes
+    return {'agent': name, 'bandits': bandits, 'grid': grid, 'episodes': episodes, 'steps': steps,
+            'seconds': seconds, 'episodes_per_sec': episodes / seconds, 'steps_per_sec': steps / seconds,
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'regret': regret}
+
+def run_benchmarks(agents, bandit_counts, grids, episodes, seed, repeat):
+    results = []
+    for name in agents:
+        for grid in grids:
+            for bandits in bandit_counts:
+                # A fresh process per case keeps peak memory honest
+                pool = multiprocessing.Pool(1)
+                result = pool.apply(run_case, ((name, bandits, grid, episodes, seed, repeat),))
+                pool.close()
+                pool.join()
+                print '{agent:>16} {grid:>7} K={bandits:<4} {episodes_per_sec:10.1f} eps/s {steps_per_sec:10.1f} steps/s {peak_rss_kb:8d} KB {regret:8.3f} regret'.format(**result)
+                results.append(result)
+    return results
+
+def case_key(result):
+    return (result['agent'], result['grid'], result['bandits'])
+
+def compare(results, baseline, threshold):
+    """
+    Prints how each case changed relative to the baseline. Returns the cases
+    that regressed by more than threshold.
+    """
+    baseline = dict((case_key(r), r) for r in baseline)
+    regressions = []
+    for result in results:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        speed = result['steps_per_sec'] / old['steps_per_sec'] - 1
+        memory = float(result['peak_rss_kb']) / old['peak_rss_kb'] - 1
+        flag = ''
+        if speed < -threshold or memory > threshold:
+            flag = 'REGRESSION'
+            regressions.append(result)
+        print '{0:>16} {1:>7} K={2:<4} steps/s {3:+7.1%} memory {4:+7.1%} {5}'.format(
+            result['agent'], result['grid'], result['bandits'], speed, memory, flag)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmarks agent and environment throughput.')
+    parser.add_argument('--agents', nargs = '+', default = AGENTS, choices = AGENTS)
+    parser.add_argument('--bandits', type = int, nargs = '+', default = BANDITS)
+    parser.add_argument('--grids', nargs = '+', default = GRIDS, help = 'Grid sizes as WIDTHxHEIGHT')
+    parser.add_argument('--episodes', type = int, default = 200)
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Timed repeats per case; the fastest is kept')
+    parser.add_argument('--save', help = 'Write the results to this JSON baseline')
+    parser.add_argument('--compare', help = 'Compare the results against this JSON baseline')
+    parser.add_argument('--threshold', type = float, default = 0.1, help = 'Relative change flagged as a regression')
+    args = parser.parse_args()
+    results = run_benchmarks(args.agents, args.bandits, args.grids, args.episodes, args.seed, args.repeat)
+    if args.save:
+        f = open(args.save, 'w')
+        json.dump(results, f, indent = 2)
+        f.close()
+    if args.compare:
+        f = open(args.compare, 'r')
+        baseline = json.load(f)
+        f.close()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
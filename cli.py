@@ -0,0 +1,94 @@
+"""
+One entry point for running and analysing experiments.
+
+    python cli.py run <outfile> <bandits> <episodes> [options]
+    python cli.py sweep [options]
+    python cli.py search <qlearning|tstd> [options]
+    python cli.py aggregate <results_dir or results.cube> [...]
+    python cli.py ingest <results.db> <results_dir or results.cube> [...] [--param KEY=VALUE]
+    python cli.py plot <graph_title> <results_dir or results.cube> [...] [--summary] [--points N] [--smooth N]
+    python cli.py plot <graph_title> --db <results.db> <experiment name> [...] [--param KEY=VALUE]
+    python cli.py summary <graph_title> [--bandits K [K ...]] [--db results.db [--window N]]
+
+Each command imports only the modules it needs, so a command that never
+plots never loads matplotlib. `python cli.py <command> -h` lists a command's
+options.
+"""
+import sys
+import argparse
+
+def run(argv):
+    import experiment
+    experiment.main(argv)
+
+def sweep(argv):
+    import sweep
+    sweep.main(argv)
+
+def search(argv):
+    import search
+    search.main(argv)
+
+def aggregate(argv):
+    parser = argparse.ArgumentParser(prog = 'cli.py aggregate',
+                                     description = 'Writes the average, stdev and stderr CSVs of experiments.')
+    parser.add_argument('sources', nargs = '+', help = 'Results directories or cubes')
+    parser.add_argument('--rebuild', action = 'store_true',
+                        help = 'Recompute the aggregates of results directories instead of updating them')
+    args = parser.parse_args(argv)
+    import plot_results
+    for source in args.sources:
+        print "Aggregating {0}".format(source)
+        plot_results.aggregate_results(source, args.rebuild)
+
+def ingest(argv):
+    import resultsdb
+    resultsdb.main(argv)
+
+def plot(argv):
+    import downsample
+    parser = argparse.ArgumentParser(prog = 'cli.py plot',
+                                     description = 'Aggregates experiments and plots their learning curves.')
+    parser.add_argument('title')
+    parser.add_argument('sources', nargs = '+', help = 'Results directories or cubes, or experiment names with --db')
+    parser.add_argument('--db', help = 'Plot experiments from this results store')
+    parser.add_argument('--param', action = 'append', metavar = 'KEY=VALUE',
+                        help = 'Pick experiments by the parameters they were run with, with --db')
+    parser.add_argument('--points', type = int, default = 2000, help = 'Points plotted per curve (0 plots every episode)')
+    parser.add_argument('--method', choices = downsample.METHODS, default = 'lttb', help = 'Downsampling method')
+    parser.add_argument('--smooth', type = int, default = 0, help = 'Moving average window, in episodes')
+    parser.add_argument('--workers', type = int, help = 'Worker processes (default: one per figure, up to one per core)')
+    parser.add_argument('--summary', action = 'store_true', help = 'Also plot the final scores against the bandit count')
+    args = parser.parse_args(argv)
+    import plot_results
+    params = None
+    if args.param:
+        import resultsdb
+        params = resultsdb.parse_params(args.param)
+    plot_results.render_figures(args.sources, args.title, args.db, params, args.workers,
+                                points = args.points, method = args.method, smooth = args.smooth)
+    if args.summary:
+        import matplotlib
+        matplotlib.use('Agg')
+        import plot_summary
+        # Only the bandit counts that were just aggregated have averages
+        bandits = plot_summary.source_bandits(args.sources) if args.db is None else None
+        plot_summary.plot_summary(args.title, bandits, db = args.db, params = params)
+        print "Plotted summary"
+
+def summary(argv):
+    import plot_summary
+    plot_summary.main(argv)
+
+COMMANDS = {'run': run, 'sweep': sweep, 'search': search, 'aggregate': aggregate, 'ingest': ingest,
+            'plot': plot, 'summary': summary}
+
+def main(argv = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print __doc__.strip()
+        exit(0 if argv and argv[0] in ['-h', '--help'] else 1)
+    COMMANDS[argv[0]](argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+A binary, memory-mapped store for all of an experiment's results.
+
+A results cube is a single file holding a (trials, episodes, series) array
+behind a small JSON header. The file is preallocated and filled with NaN, so
+parallel workers can each write their own trial's slice in place, and rows
+that have not been written yet are easy to spot. Readers map the file and
+work on the array directly, without parsing any text.
+"""
+import json
+import numpy as np
+
+CUBE_SUFFIX = '.cube'
+MAGIC = 'RESULTSCUBE\n'
+HEADER_SIZE = 4096
+
+def create_cube(filename, name, trials, episodes, series, dtype = 'float32'):
+    """
+    Preallocates a cube for trials x episodes rows of the given series. The
+    first series names the x axis (e.g. 'Episodes') and is not stored.
+    """
+    header = json.dumps({'name': name, 'trials': trials, 'episodes': episodes,
+                         'series': series, 'dtype': dtype})
+    if len(MAGIC) + len(header) + 1 > HEADER_SIZE:
+        raise ValueError('Cube header is too large')
+    f = open(filename, 'wb')
+    f.write((MAGIC + header + '\n').ljust(HEADER_SIZE))
+    f.close()
+    data = np.memmap(filename, dtype=dtype, mode='r+', offset=HEADER_SIZE,
+                     shape=(trials, episodes, len(series) - 1))
+    data[:] = np.nan
+    data.flush()
+    del data
+
+def read_header(filename):
+    f = open(filename, 'rb')
+    block = f.read(HEADER_SIZE)
+    f.close()
+    if not block.startswith(MAGIC):
+        raise ValueError('{0} is not a results cube'.format(filename))
+    return json.loads(block[len(MAGIC):].strip())
+
+def open_cube(filename, mode = 'r'):
+    """
+    Maps a cube. Returns (header, data) where data is the
+    (trials, episodes, series) array.
+    """
+    header = read_header(filename)
+    data = np.memmap(filename, dtype=header['dtype'], mode=mode, offset=HEADER_SIZE,
+                     shape=(header['trials'], header['episodes'], len(header['series']) - 1))
+    return (header, data)
+
+def completed_rows(trial):
+    """
+    Returns how many leading rows of a trial's slice have been written.
+    """
+    unwritten = np.isnan(trial[:,0])
+    return len(trial) if not unwritten.any() else int(unwritten.argmax())
+
+class CubeWriter(object):
+    """
+    Writes one trial's rows into a cube. Rows have the same form as a results
+    CSV row: the episode number followed by one value per series.
+    """
+    def __init__(self, filename, trial):
+        (self.header, data) = open_cube(filename, 'r+')
+        self.data = data[trial]
+
+    def writerow(self, row):
+        self.data[int(row[0]) - 1] = row[1:]
+
+    def flush(self):
+        self.data.flush()
+
+    def close(self):
+        self.flush()
+        del self.data
@@ -0,0 +1,99 @@
+"""
+Downsampling and smoothing for long learning curves.
+
+A curve of 100,000 episodes has far more points than a figure has pixels.
+Plotting a few thousand of them looks the same and renders much faster, as
+long as the reduction keeps the curve's shape:
+
+    lttb    Largest-Triangle-Three-Buckets: keeps the point in each bucket
+            that forms the largest triangle with its neighbours' picks
+    minmax  keeps the lowest and highest point of each window, so spikes
+            survive
+    mean    averages each window
+"""
+import warnings
+import numpy as np
+
+METHODS = ['lttb', 'minmax', 'mean']
+
+def moving_average(y, window):
+    """
+    Returns the trailing moving average of y. The first window - 1 points
+    average over the points before them.
+    """
+    if window <= 1:
+        return y
+    total = np.cumsum(np.concatenate(([0.], y)))
+    counts = np.minimum(np.arange(1, len(y) + 1), window)
+    return (total[1:] - total[np.maximum(np.arange(1, len(y) + 1) - window, 0)]) / counts
+
+def lttb(x, y, points):
+    """
+    Returns the indices of the points that Largest-Triangle-Three-Buckets
+    keeps, always including the first and last.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    # The points between the first and last are split into points - 2 buckets
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    (sum_x, sum_y) = (np.concatenate(([0.], np.cumsum(x))), np.concatenate(([0.], np.cumsum(y))))
+    keep = np.zeros(points, dtype=int)
+    keep[-1] = n - 1
+    a = 0
+    for b in range(points - 2):
+        (lo, hi) = (edges[b], edges[b+1])
+        # The next bucket is summarized by its mean, and the last by the last point
+        (next_lo, next_hi) = (edges[b+1], edges[b+2]) if b + 2 < len(edges) else (n - 1, n)
+        mean_x = (sum_x[next_hi] - sum_x[next_lo]) / (next_hi - next_lo)
+        mean_y = (sum_y[next_hi] - sum_y[next_lo]) / (next_hi - next_lo)
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + area.argmax()
+        keep[b+1] = a
+    return keep
+
+def windows(y, count):
+    """
+    Splits y into count windows of equal width, as the rows of a
+    NaN-padded array.
+    """
+    width = -(-len(y) // count)
+    padded = np.full(width * count, np.nan)
+    padded[:len(y)] = y
+    return padded.reshape(count, width)
+
+def minmax(y, points):
+    """
+    Returns the indices of the lowest and highest point of each of points / 2
+    windows, in order.
+    """
+    if points >= len(y):
+        return np.arange(len(y))
+    w = windows(y, max(points // 2, 1))
+    offsets = np.arange(len(w)) * w.shape[1]
+    # Trailing windows can be all padding
+    full = ~np.isnan(w).all(axis=1)
+    (w, offsets) = (w[full], offsets[full])
+    return np.unique(np.concatenate((offsets + np.nanargmin(w, axis=1), offsets + np.nanargmax(w, axis=1))))
+
+def window_means(x, values, points):
+    """
+    Returns the mean of x and of each of values over points windows of x.
+    """
+    full = ~np.isnan(windows(x, points)).all(axis=1)
+    with warnings.catch_warnings():
+        # A window whose values are all NaN stays NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return [np.nanmean(windows(y, points)[full], axis=1) for y in [x] + values]
+
+def downsample(x, y, band, points, method = 'lttb'):
+    """
+    Reduces a curve x, y and its error band to about points points, picking
+    the points from y.
+    """
+    if not points or len(x) <= points:
+        return (x, y, band)
+    if method == 'mean':
+        return tuple(window_means(x, [y, band], points))
+    keep = lttb(x, y, points) if method == 'lttb' else minmax(y, points)
+    return (x[keep], y[keep], band[keep])
@@ -1,48 +1,250 @@
-import sys
+import os
 import csv
+import gzip
+import argparse
+import cPickle as pickle
 from gridworld import *
 import qlearning
 import tstd
+import cube
+import oracle
+from trajectory import TrajectoryRecorder, TRAJECTORY_SUFFIX
+from tape import ActionTape
+from instrument import EpisodeLog
 
+def checkpoint_file(outfile, trial = None):
+    if trial is None:
+        return outfile + '.ckpt'
+    return '{0}.{1}.ckpt'.format(outfile, trial)
 
+def save_checkpoint(filename, state):
+    """
+    Atomically writes a compressed checkpoint, so a preempted write never
+    clobbers the previous one.
+    """
+    f = gzip.open(filename + '.tmp', 'wb')
+    pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(filename + '.tmp', filename)
 
-if __name__ == "__main__":
-    build_rewards()
-    outfile = sys.argv[1]
-    bandits = int(sys.argv[2])
-    episodes = int(sys.argv[3])
-    world = GridWorld(num_bandits = bandits)
+def load_checkpoint(filename):
+    f = gzip.open(filename, 'rb')
+    state = pickle.load(f)
+    f.close()
+    return state
+
+def experiment_series(regret = False):
+    """
+    Returns the column headers of an experiment's results.
     """
-    # TESTING WITH DETERMINISTIC WORLD
-    world.bandits[UP].first = 1
-    world.bandits[UP].second = 0
-    world.bandits[RIGHT].first = 0
-    world.bandits[RIGHT].second = 1
-    world.bandits[DOWN].first = 0
-    world.bandits[DOWN].second = 0
-    """
-    agents = [tstd.TSTDAgent(bandits), qlearning.QAgent(bandits)]
     series = ['Episodes', 'TSTD(0)', 'Q-Learning']
-    row = [0 for _ in range(len(agents)+1)]
-    f = open(outfile, 'wb')
-    writer = csv.writer(f)
-    writer.writerow(series)
-    for ep in range(episodes):
-        if ep % 10 == 0:
+    if regret:
+        series += ['TSTD(0) Regret', 'Q-Learning Regret']
+    return series
+
+def run_experiment(outfile, bandits, episodes, layout = None, seed = None, trial = None,
+                   checkpoint_every = 0, resume = False, log = None, regret = False, record = None,
+                   tape = None, save_tape = None, eval_interval = 1, eval_tstd = False, planning = None,
+                   plan_every = 0, resample = 'always', resample_every = 10, index = False):
+    """
+    Plays TSTD(0) and Q-Learning against the same bandits for the given number
+    of episodes and writes one row of scores per episode to outfile. Returns
+    the agents.
+
+    TSTD(0) is scored by the episode it played. Q-Learning is scored by the
+    exact expected score of its greedy policy (see oracle.py), evaluated every
+    eval_interval episodes and held in between. With eval_tstd, TSTD(0) is
+    scored the same way, by the policy that picks the least-regret bandit
+    under its posterior means.
+
+    If trial is given, outfile is a results cube and the rows are written into
+    that trial's slice of it instead of a CSV.
+
+    Each agent plays in its own world built from the trial seed, so both see
+    the same bandit outcomes, and each agent has its own random stream. An
+    unseeded run picks its seed at random and prints it.
+
+    Every checkpoint_every episodes the worlds, agents (including all of their
+    random streams) and the CSV write position are saved next to outfile. With
+    resume, a run picks up from its last checkpoint and produces exactly the
+    rows an uninterrupted run would have.
+
+    If log is given, every episode is instrumented and recorded as a JSON line
+    in that file (see instrument.py) instead of printing progress.
+
+    With regret, each agent also gets a column holding the optimal expected
+    episode score (see oracle.py) minus the score it got.
+
+    With record, every transition of each agent is written to
+    <record>_<agent>.traj (see trajectory.py).
+
+    If tape is an ActionTape (see tape.py), both worlds replay its bandits
+    instead of drawing them from the seed. With save_tape, the bandits and
+    every outcome the agents pulled are saved to that file at the end.
+
+    With planning = 'sweep', TSTD(0) also plans with the
+    known layout every plan_every steps, or at the end of every episode if
+    plan_every is 0. resample picks how often TSTD(0) samples its posteriors,
+    and resample_every is the interval of the 'interval' policy (see
+    tstd.TSTDAgent).
+
+    With index, both agents pick bandits through an index instead of a scan
+    of every bandit (see banditindex.py). TSTD(0) then needs a resampling
+    policy that keeps samples between steps.
+    """
+    if layout is None:
+        layout = build_layout()
+    checkpoint = checkpoint_file(outfile, trial)
+    if seed is None:
+        # Both worlds need the same bandits, and resuming exactly needs every
+        # random stream to be explicit
+        seed = np.random.randint(2**31)
+        print 'Seed: {0}'.format(seed)
+    start = 0
+    if resume and os.path.exists(checkpoint):
+        state = load_checkpoint(checkpoint)
+        (start, worlds, agents) = (state['episode'], state['worlds'], state['agents'])
+        print 'Resuming from episode {0}'.format(start)
+    else:
+        agents = [tstd.TSTDAgent(bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 0),
+                                 planning = planning, plan_every = plan_every, resample = resample,
+                                 resample_every = resample_every, index = index),
+                  qlearning.QAgent(bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 1), index = index)]
+        worlds = [GridWorld(num_bandits = bandits, agent = agent, layout = layout, seed = seed, tape = tape)
+                  for agent in agents]
+    """
+    # TESTING WITH DETERMINISTIC WORLD
+    for world in worlds:
+        world.bandits[UP].first = 1
+        world.bandits[UP].second = 0
+        world.bandits[RIGHT].first = 0
+        world.bandits[RIGHT].second = 1
+        world.bandits[DOWN].first = 0
+        world.bandits[DOWN].second = 0
+    """
+    series = experiment_series(regret)
+    if regret:
+        # Both worlds have the same bandits, so one solve covers both agents
+        optimal = oracle.optimal_value(worlds[0])
+    if log is not None:
+        if start > 0 and state.get('log_offset') is not None and os.path.exists(log):
+            # Drop any records written after the checkpoint
+            log = open(log, 'r+b')
+            log.truncate(state['log_offset'])
+            log.seek(state['log_offset'])
+        else:
+            log = open(log, 'ab' if start > 0 else 'wb')
+        for world,name in zip(worlds, series[1:len(agents)+1]):
+            world.log = EpisodeLog(log, agent = name)
+    if record is not None:
+        for i,(world,name) in enumerate(zip(worlds, ['tstd', 'qlearning'])):
+            filename = '{0}_{1}{2}'.format(record, name, TRAJECTORY_SUFFIX)
+            resuming = start > 0 and state.get('trajectories') is not None and os.path.exists(filename)
+            if resuming:
+                # Drop any transitions written after the checkpoint
+                (offset, recorded) = state['trajectories'][i]
+                t = open(filename, 'r+b')
+                t.truncate(offset)
+                t.close()
+            world.recorder = TrajectoryRecorder(world, filename, append = resuming)
+            if resuming:
+                world.recorder.episodes = recorded
+    row = [0 for _ in series]
+    evaluations = state.get('evaluations') if start > 0 else None
+    if evaluations is None:
+        evaluations = [None for _ in agents]
+    if trial is not None:
+        f = writer = cube.CubeWriter(outfile, trial)
+    elif start > 0:
+        # Drop any rows written after the checkpoint
+        f = open(outfile, 'r+b')
+        f.truncate(state['offset'])
+        f.seek(state['offset'])
+        writer = csv.writer(f)
+    else:
+        f = open(outfile, 'wb')
+        writer = csv.writer(f)
+        writer.writerow(series)
+    for ep in range(start, episodes):
+        if log is None and ep % 10 == 0:
             print ep
         row[0] = ep + 1
-        for i,agent in enumerate(agents):
-            world.agent = agent
+        for i,(world,agent) in enumerate(zip(worlds, agents)):
+            if log is not None:
+                world.log.fields['episode'] = ep + 1
             score = world.play_episode()
-            if i == 1:
-                prev_epsilon = agent.epsilon
-                agent.epsilon = 0
-                score = world.play_episode()
-                agent.epsilon = prev_epsilon
+            if i == 1 or eval_tstd:
+                if ep % eval_interval == 0 or evaluations[i] is None:
+                    policy = agent.greedy_policy() if i == 1 else agent.mean_policy()
+                    evaluations[i] = oracle.policy_value(world, policy)
+                score = evaluations[i]
             row[i+1] = score
+            if regret:
+                row[len(agents)+i+1] = optimal - score
         writer.writerow(row)
+        if checkpoint_every and (ep + 1) % checkpoint_every == 0 and ep + 1 < episodes:
+            f.flush()
+            if log is not None:
+                log.flush()
+            trajectories = None
+            if record is not None:
+                for world in worlds:
+                    world.recorder.flush()
+                trajectories = [(os.path.getsize(world.recorder.filename), world.recorder.episodes) for world in worlds]
+            save_checkpoint(checkpoint, {'episode': ep + 1, 'worlds': worlds, 'agents': agents,
+                                         'offset': f.tell() if trial is None else None,
+                                         'log_offset': log.tell() if log is not None else None,
+                                         'trajectories': trajectories, 'evaluations': evaluations})
     f.flush()
     f.close()
-    print_state_values(agents[1].visits)
-    print_q_values(agents[1].q)
-    print_q_values(agents[1].q_visits)
+    if save_tape is not None:
+        ActionTape.from_worlds(worlds).save(save_tape)
+    if log is not None:
+        log.close()
+    if record is not None:
+        for world in worlds:
+            world.recorder.close()
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return agents
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Runs one trial of TSTD(0) vs. Q-Learning.')
+    parser.add_argument('outfile', help = 'Results CSV, or a results cube when --trial is given')
+    parser.add_argument('bandits', type = int)
+    parser.add_argument('episodes', type = int)
+    parser.add_argument('--layout', help = 'ASCII layout spec file')
+    parser.add_argument('--seed', type = int, help = 'Trial seed (default: chosen at random and printed)')
+    parser.add_argument('--trial', type = int, help = 'Slice of the results cube to write')
+    parser.add_argument('--checkpoint-every', type = int, default = 0, help = 'Episodes between checkpoints (default: never)')
+    parser.add_argument('--resume', action = 'store_true', help = 'Continue from the last checkpoint, if there is one')
+    parser.add_argument('--log', help = 'Instrument every episode and write JSON lines records to this file')
+    parser.add_argument('--regret', action = 'store_true', help = 'Add a column of per-episode regret for each agent')
+    parser.add_argument('--record', metavar = 'PREFIX', help = 'Record every transition to PREFIX_<agent>.traj')
+    parser.add_argument('--eval-interval', type = int, default = 1, help = 'Episodes between exact policy evaluations')
+    parser.add_argument('--eval-tstd', action = 'store_true',
+                        help = 'Score TSTD(0) by its posterior-mean policy rather than the episode it played')
+    parser.add_argument('--replay', metavar = 'TAPE', help = 'Replay the bandits and outcomes of a saved action tape')
+    parser.add_argument('--save-tape', metavar = 'TAPE', help = 'Save the bandits and their outcomes to an action tape')
+    parser.add_argument('--planning', choices = ['sweep'],
+                        help = 'Let TSTD(0) plan with the known layout under its posterior means')
+    parser.add_argument('--plan-every', type = int, default = 0,
+                        help = 'Steps between TSTD(0) plans (default: at the end of each episode)')
+    parser.add_argument('--resample', choices = tstd.RESAMPLE_POLICIES, default = 'always',
+                        help = 'When TSTD(0) samples its posteriors (default: twice per step)')
+    parser.add_argument('--resample-every', type = int, default = 10, help = 'Steps between samples with --resample interval')
+    parser.add_argument('--index', action = 'store_true',
+                        help = 'Pick bandits through an index, for thousands of bandits (TSTD(0) needs --resample changed, interval or episode)')
+    args = parser.parse_args(argv)
+    layout = load_layout(args.layout) if args.layout else build_layout()
+    tape = ActionTape.load(args.replay) if args.replay else None
+    agents = run_experiment(args.outfile, args.bandits, args.episodes, layout, args.seed, args.trial,
+                            args.checkpoint_every, args.resume, args.log, args.regret, args.record,
+                            tape, args.save_tape, args.eval_interval, args.eval_tstd, args.planning,
+                            args.plan_every, args.resample, args.resample_every, args.index)
+    print_state_values(layout, agents[1].visits)
+    print_q_values(layout, agents[1].q)
+    print_q_values(layout, agents[1].q_visits)
+
+if __name__ == "__main__":
+    main()
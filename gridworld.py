@@ -49,82 +49,58 @@ Created by Wesley Tansey
 2/24/2013
 Code released under the MIT license.
 """
-import random
-
-# Actions an agent can take
-UP = 0
-RIGHT = 1
-DOWN = 2
-
-ACTION_NAMES = ['Up', 'Right', 'Down']
-
-GRID_WIDTH = 4
-GRID_HEIGHT = 3
-START = (0, int(GRID_HEIGHT / 2))
-GOAL = (GRID_WIDTH - 1, int(GRID_HEIGHT / 2))
-GOAL_REWARD = 10
-WALL_PENALTY = -4
-
-REWARDS = { ((0,0),UP): ((0,0),-4) }
-
-def build_rewards():
-    for x in range(GRID_WIDTH):
-        for y in range(GRID_HEIGHT):
-            REWARDS[((x,y),UP)] = up_transition_reward(x,y)
-            REWARDS[((x,y),RIGHT)] = right_transition_reward(x,y)
-            REWARDS[((x,y),DOWN)] = down_transition_reward(x,y)
-
-def up_transition_reward(x, y):
-    if y == 0:
-        return ((x, y),WALL_PENALTY)
-    if x == GOAL[0] and y == GOAL[1]+1:
-        return (GOAL,GOAL_REWARD)
-    return ((x,y-1),0)
-
-def right_transition_reward(x, y):
-    if x == GRID_WIDTH - 1:
-        return ((x,y),WALL_PENALTY)
-    if x == GOAL[0]-1 and y == GOAL[1]:
-        return (GOAL,GOAL_REWARD - 1)
-    # Handle the special transition rewards
-    if x == GRID_WIDTH - 2:
-        if y == 0:
-            return ((x+1,y), -1)
-        else:
-            return ((x+1,y), 3)
-    return ((x+1,y),0)
-
-def down_transition_reward(x, y):
-    if y == GRID_HEIGHT - 1:
-        return ((x, y), WALL_PENALTY)
-    if x == GOAL[0] and y == GOAL[1]-1:
-        return (GOAL, GOAL_REWARD)
-    return ((x,y+1),0)
+import time
+import numpy as np
+from layout import *
 
+# Independent random streams derived from a single trial seed
+WORLD_STREAM = 0
+ACTION_STREAM = 1
+AGENT_STREAM = 2
 
+# Actions drawn per bandit at a time
+BLOCK_SIZE = 1024
 
-def print_world():
-    print "-" * (12*GRID_WIDTH+1)
-    for y in range(GRID_HEIGHT):
-        if y != GOAL[1]:
-            top = "|" + ("     ^     |"*GRID_WIDTH)
-            bottom = "|" + ("     v     |"*GRID_WIDTH)
-        else:
-            top = "|" + ("     ^     |"*(GRID_WIDTH-1)) + "           |"
-            bottom = "|" + ("     v     |"*(GRID_WIDTH-1)) + "           |"
-        blank = "|" + ("           |"*GRID_WIDTH)
+def make_rng(seed, stream, *keys):
+    """
+    Returns the RandomState for one stream of a trial. Streams are keyed by
+    the trial seed, a stream id and any extra integer keys, so the same seed
+    always reproduces the same streams. A seed of None gives the global
+    NumPy stream.
+    """
+    if seed is None:
+        return np.random.mtrand._rand
+    words = []
+    while True:
+        words.append(seed & 0xffffffff)
+        seed >>= 32
+        if seed == 0:
+            break
+    return np.random.RandomState(words + [stream] + list(keys))
+
+def print_world(layout):
+    print "-" * (12*layout.width+1)
+    for y in range(layout.height):
+        top = "|"
+        bottom = "|"
         up = "|"
         right = "|"
         down = "|"
-        for x in range(GRID_WIDTH):
-            if (x,y) == GOAL:
+        blank = "|" + ("           |"*layout.width)
+        for x in range(layout.width):
+            s = layout.state_id(x, y)
+            if s == layout.goal:
+                top += "           |"
+                bottom += "           |"
                 up += "           |"
                 right += "    GOAL   |"
                 down += "           |"
             else:
-                up += str(REWARDS[((x,y),UP)][1]).center(11) + "|"
-                right += str(REWARDS[((x,y),RIGHT)][1]).rjust(9) + " >|"
-                down += str(REWARDS[((x,y),DOWN)][1]).center(11) + "|"
+                top += "     ^     |"
+                bottom += "     v     |"
+                up += str(layout.reward[s,UP]).center(11) + "|"
+                right += str(layout.reward[s,RIGHT]).rjust(9) + " >|"
+                down += str(layout.reward[s,DOWN]).center(11) + "|"
         print top
         print up
         print blank
@@ -132,30 +108,31 @@ def print_world():
         print blank
         print down
         print bottom
-        print "-" * (12*GRID_WIDTH+1)
-
-def print_q_values(q):
-    print "-" * (12*GRID_WIDTH+1)
-    for y in range(GRID_HEIGHT):
-        if y != GOAL[1]:
-            top = "|" + ("     ^     |"*GRID_WIDTH)
-            bottom = "|" + ("     v     |"*GRID_WIDTH)
-        else:
-            top = "|" + ("     ^     |"*(GRID_WIDTH-1)) + "           |"
-            bottom = "|" + ("     v     |"*(GRID_WIDTH-1)) + "           |"
-        blank = "|" + ("           |"*GRID_WIDTH)
+        print "-" * (12*layout.width+1)
+
+def print_q_values(layout, q):
+    print "-" * (12*layout.width+1)
+    for y in range(layout.height):
+        top = "|"
+        bottom = "|"
         up = "|"
         right = "|"
         down = "|"
-        for x in range(GRID_WIDTH):
-            if (x,y) == GOAL:
+        blank = "|" + ("           |"*layout.width)
+        for x in range(layout.width):
+            s = layout.state_id(x, y)
+            if s == layout.goal:
+                top += "           |"
+                bottom += "           |"
                 up += "           |"
                 right += "    GOAL   |"
                 down += "           |"
             else:
-                up += "{0:0.2f}".format(q[((x,y),UP)]).center(11) + "|"
-                right += "{0:0.2f}".format(q[((x,y),RIGHT)]).rjust(9) + " >|"
-                down += "{0:0.2f}".format(q[((x,y),DOWN)]).center(11) + "|"
+                top += "     ^     |"
+                bottom += "     v     |"
+                up += "{0:0.2f}".format(q[(s,UP)]).center(11) + "|"
+                right += "{0:0.2f}".format(q[(s,RIGHT)]).rjust(9) + " >|"
+                down += "{0:0.2f}".format(q[(s,DOWN)]).center(11) + "|"
         print top
         print up
         print blank
@@ -163,15 +140,15 @@ def print_q_values(q):
         print blank
         print down
         print bottom
-        print "-" * (12*GRID_WIDTH+1)
+        print "-" * (12*layout.width+1)
 
-def print_state_values(v):
-    print "-" * (12*GRID_WIDTH+1)
-    for y in range(GRID_HEIGHT):
-        blank = "|" + ("           |"*GRID_WIDTH)
+def print_state_values(layout, v):
+    print "-" * (12*layout.width+1)
+    for y in range(layout.height):
+        blank = "|" + ("           |"*layout.width)
         value = "|"
-        for x in range(GRID_WIDTH):
-            value += "{0:0.2f}".format(v[(x,y)]).center(11) + "|"
+        for x in range(layout.width):
+            value += "{0:0.2f}".format(v[layout.state_id(x, y)]).center(11) + "|"
         print blank
         print blank
         print blank
@@ -179,40 +156,80 @@ def print_state_values(v):
         print blank
         print blank
         print blank
-        print "-" * (12*GRID_WIDTH+1)
+        print "-" * (12*layout.width+1)
+
+def sample_actions(rng, first, second, n):
+    """
+    Draws n actions of a bandit with the given partitions in one call. The
+    actions are the same as n single draws: UP below first, RIGHT below
+    second and DOWN otherwise.
+    """
+    r = rng.random_sample(n)
+    return (r >= first).astype(np.uint8) + (r >= second)
 
 class Bandit(object):
     """
     A simple multinomial bandit. It returns one of three grid world actions:
     UP, RIGHT, or DOWN at every call of sample. Each sample of a specific
     bandit instance is IID.
+
+    The partitions are drawn from rng and the actions from action_rng, or
+    else from stream key of the seed's ACTION_STREAM, so two bandits built
+    from identically seeded streams return identical outcomes on every pull.
+    Actions are drawn block_size at a time and handed out one per pull. A
+    seeded stream is only made on the first pull, since a RandomState takes
+    a few KB and a world can have hundreds of thousands of bandits.
     """
-    def __init__(self):
-        partition1 = random.random()
-        partition2 = random.random()
+    def __init__(self, rng = None, action_rng = None, block_size = BLOCK_SIZE, seed = None, key = 0):
+        rng = rng if rng is not None else np.random.mtrand._rand
+        self.rng = action_rng
+        self.seed = seed
+        self.key = key
+        partition1 = rng.random_sample()
+        partition2 = rng.random_sample()
         self.first = min(partition1, partition2)
         self.second = max(partition1, partition2) 
+        self.block_size = block_size
+        self.block = []
+        self.pos = 0
+        self.blocks = 0
 
     def sample(self):
-        r = random.random()
-        if r < self.first:
-            return UP
-        if r < self.second:
-            return RIGHT
-        return DOWN
+        if self.pos == len(self.block):
+            self.next_block()
+        self.pos += 1
+        return self.block[self.pos - 1]
+
+    def next_block(self):
+        if self.rng is None:
+            self.rng = make_rng(self.seed, ACTION_STREAM, self.key)
+        self.block = sample_actions(self.rng, self.first, self.second, self.block_size).tolist()
+        self.pos = 0
+        self.blocks += 1
+
+    def pulls(self):
+        """
+        Returns how many times the bandit has been sampled.
+        """
+        return max(self.blocks - 1, 0) * self.block_size + self.pos
 
 class Agent(object):
     """
     An abstract base class that grid world agents must extend.
 
-    The agent is told how many bandits there are to choose from and what the
-    reward function looks like for each state transition at the start of an
-    episode. At every iteration of an episode, the agent is told its current
-    (x,y) location in the world and it must return a bandit to sample an action
-    from. After every action, the agent receives a reward from the environment.
+    The agent is told how many bandits there are to choose from and given the
+    Layout that describes the reward function for each state transition. At
+    every iteration of an episode, the agent is told the integer id of its
+    current state and it must return a bandit to sample an action from. After
+    every action, the agent receives a reward from the environment.
+
+    Agents draw all of their random numbers from rng, which defaults to the
+    global NumPy stream.
     """
-    def __init__(self, num_bandits):
+    def __init__(self, num_bandits, layout = None, rng = None):
         self.num_bandits = num_bandits
+        self.layout = layout if layout is not None else build_layout()
+        self.rng = rng if rng is not None else np.random.mtrand._rand
 
     def episode_starting(self, state):
         pass
@@ -232,17 +249,63 @@ class Agent(object):
     def observe_reward(self, r):
         pass
 
+    def stats(self):
+        """
+        Returns a dict of agent-specific values to include in episode logs.
+        """
+        return {}
+
 class GridWorld(object):
-    def __init__(self, max_moves = 100, num_bandits = 20, agent = None):
+    """
+    A grid world with num_bandits bandits. Worlds built with the same seed
+    have the same bandits and the same sequence of outcomes for each bandit,
+    so agents played in separate, identically seeded worlds see common random
+    numbers.
+
+    If tape is an ActionTape (see tape.py), the world's bandits replay it
+    instead of being drawn from the seed.
+
+    If log is an EpisodeLog (see instrument.py), every episode is timed and
+    recorded to it. If recorder is a TrajectoryRecorder (see trajectory.py),
+    every transition is recorded to it.
+    """
+    def __init__(self, max_moves = 100, num_bandits = 20, agent = None, layout = None, seed = None, log = None,
+                 tape = None):
         self.max_moves = max_moves
+        self.log = log
+        self.recorder = None
         self.num_bandits = num_bandits
         self.agent = agent
-        self.bandits = [Bandit() for _ in range(self.num_bandits)]
+        self.layout = layout if layout is not None else build_layout()
+        # Plain lists index faster than NumPy arrays one element at a time
+        self.transitions = self.layout.next_state.tolist()
+        self.rewards = self.layout.reward.tolist()
+        self.seed = seed
+        if tape is not None:
+            self.seed = tape.seed
+            self.num_bandits = tape.num_bandits
+            self.bandits = tape.bandits()
+        else:
+            rng = make_rng(seed, WORLD_STREAM)
+            self.bandits = [Bandit(rng, seed = seed, key = b) for b in range(self.num_bandits)]
+        # Number of moves made in the last episode
+        self.moves = 0
+
+    def __getstate__(self):
+        # Logs and recorders write to files, which are not part of a world's
+        # state
+        state = dict(self.__dict__)
+        state['log'] = None
+        state['recorder'] = None
+        return state
 
     def play_episode(self):
-        state = START
+        if self.log is not None or self.recorder is not None:
+            return self.play_instrumented_episode()
+        state = self.layout.start
         total_reward = 0
         self.agent.episode_starting(state)
+        i = -1
         for i in range(self.max_moves):
             bidx = self.agent.get_bandit()
             assert(bidx >= 0)
@@ -250,16 +313,72 @@ class GridWorld(object):
             bandit = self.bandits[bidx]
             action = bandit.sample()
             self.agent.observe_action(action)
-            sr = REWARDS[(state, action)]
-            total_reward += sr[1]
-            self.agent.observe_reward(sr[1])
-            state = sr[0]
+            r = self.rewards[state][action]
+            total_reward += r
+            self.agent.observe_reward(r)
+            state = self.transitions[state][action]
+            self.agent.set_state(state)
+            if state == self.layout.goal:
+                break
+        self.moves = i + 1
+        self.agent.episode_over()
+        return total_reward
+
+    def play_instrumented_episode(self):
+        clock = time.time
+        start = clock()
+        decision = transition = update = 0.0
+        wall_bumps = 0
+        state = self.layout.start
+        total_reward = 0
+        recording = self.recorder is not None
+        if recording:
+            (states, bandits, actions, rewards) = ([state], [], [], [])
+        self.agent.episode_starting(state)
+        i = -1
+        for i in range(self.max_moves):
+            t0 = clock()
+            bidx = self.agent.get_bandit()
+            t1 = clock()
+            assert(bidx >= 0)
+            assert(bidx < self.num_bandits)
+            action = self.bandits[bidx].sample()
+            r = self.rewards[state][action]
+            next_state = self.transitions[state][action]
+            t2 = clock()
+            self.agent.observe_action(action)
+            total_reward += r
+            self.agent.observe_reward(r)
+            if next_state == state:
+                wall_bumps += 1
+            if recording:
+                states.append(next_state)
+                bandits.append(bidx)
+                actions.append(action)
+                rewards.append(r)
+            state = next_state
             self.agent.set_state(state)
-            if state == GOAL:
+            t3 = clock()
+            decision += t1 - t0
+            transition += t2 - t1
+            update += t3 - t2
+            if state == self.layout.goal:
                 break
+        self.moves = i + 1
+        t0 = clock()
         self.agent.episode_over()
+        update += clock() - t0
+        if recording:
+            self.recorder.record_episode(states, bandits, actions, rewards)
+        if self.log is None:
+            return total_reward
+        fields = {'steps': self.moves, 'reward': total_reward, 'goal': state == self.layout.goal,
+                  'timeout': state != self.layout.goal and self.moves == self.max_moves,
+                  'wall_bumps': wall_bumps, 'decision_s': decision, 'transition_s': transition,
+                  'update_s': update, 'wall_s': clock() - start}
+        fields.update(self.agent.stats())
+        self.log.record(fields)
         return total_reward
 
 if __name__ == "__main__":
-    build_rewards()
-    print_world()
+    print_world(build_layout())
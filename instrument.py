@@ -0,0 +1,40 @@
+"""
+Opt-in instrumentation for grid world episodes.
+
+When a GridWorld is given an EpisodeLog, every episode it plays is timed and
+counted, and one JSON record per episode is appended to the log's stream:
+
+    {"agent": "TSTD(0)", "episode": 12, "steps": 9, "reward": 7, "goal": true,
+     "timeout": false, "wall_bumps": 1, "decision_s": ..., "transition_s": ...,
+     "update_s": ..., "wall_s": ..., "alpha": 1.0}
+
+decision_s is time spent in the agent's get_bandit, transition_s is time
+spent sampling the bandit and moving in the world, and update_s is time spent
+in the agent's observe and set_state callbacks and in episode_over. Anything
+the agent reports from Agent.stats(), and any fields set on the log itself
+(e.g. the agent's name and the episode number), are merged into the record. A
+world with no log plays its episodes on the uninstrumented path.
+"""
+import json
+
+class EpisodeLog(object):
+    """
+    Writes one JSON line per episode to stream. The keyword fields are added
+    to every record and may be changed between episodes.
+    """
+    def __init__(self, stream, **fields):
+        self.stream = stream
+        self.fields = fields
+
+    def record(self, fields):
+        fields.update(self.fields)
+        self.stream.write(json.dumps(fields, sort_keys = True) + '\n')
+
+def read_log(filename):
+    """
+    Reads every record of a JSON lines episode log.
+    """
+    f = open(filename, 'r')
+    records = [json.loads(line) for line in f if line.strip()]
+    f.close()
+    return records
@@ -0,0 +1,202 @@
+"""
+Compiled grid layouts for the Multi-Armed Bandit Grid World.
+
+A Layout numbers the cells of a grid with integer state ids and stores the
+full transition and reward model as two dense arrays, next_state[S,A] and
+reward[S,A]. Layouts can be built procedurally with build_layout(), which
+reproduces the original MAB Grid World at any size, or parsed from an ASCII
+spec file with load_layout(). Parsed layouts are cached next to the spec
+file in compiled form.
+
+An ASCII spec has a few optional settings, a grid, and optional per
+transition reward overrides:
+
+    # The original 4x3 MAB Grid World
+    wall_penalty -4
+    goal_reward 10
+    ....
+    S..G
+    ....
+    reward 2 0 Right -1
+    reward 2 1 Right 9
+    reward 2 2 Right 3
+
+Grid cells are '.' (open), 'S' (start), 'G' (goal) and 'X' (blocked).
+Moving off the grid or into a blocked cell leaves the agent where it was and
+costs wall_penalty. Moving into the goal earns goal_reward. Each override
+line sets the reward for taking an action from cell (x, y). Anything after
+a '#' is a comment.
+"""
+import os
+import numpy as np
+
+# Actions an agent can take
+UP = 0
+RIGHT = 1
+DOWN = 2
+
+ACTION_NAMES = ['Up', 'Right', 'Down']
+
+GRID_WIDTH = 4
+GRID_HEIGHT = 3
+GOAL_REWARD = 10
+WALL_PENALTY = -4
+
+MOVES = [(0,-1), (1,0), (0,1)]
+
+class Layout(object):
+    """
+    A grid world transition and reward model over integer state ids. The
+    state id of cell (x, y) is y * width + x.
+    """
+    def __init__(self, width, height, start, goal, next_state, reward):
+        self.width = width
+        self.height = height
+        self.start = start
+        self.goal = goal
+        self.next_state = next_state
+        self.reward = reward
+        self.num_states = width * height
+        self.num_actions = len(ACTION_NAMES)
+        self.pred_indptr = None
+        self.pred_indices = None
+
+    def predecessors(self, state):
+        """
+        Returns the ids of every state with a transition into state.
+        """
+        if self.pred_indptr is None:
+            self.build_predecessors()
+        return self.pred_indices[self.pred_indptr[state]:self.pred_indptr[state+1]]
+
+    def build_predecessors(self):
+        """
+        Builds the reverse-transition index in compressed sparse row form.
+        """
+        sources = np.repeat(np.arange(self.num_states), self.num_actions)
+        keys = np.unique(self.next_state.ravel() * self.num_states + sources)
+        self.pred_indices = keys % self.num_states
+        self.pred_indptr = np.searchsorted(keys // self.num_states, np.arange(self.num_states + 1))
+
+    def state_id(self, x, y):
+        return y * self.width + x
+
+    def coords(self, state):
+        return (state % self.width, state // self.width)
+
+    def save(self, filename):
+        f = open(filename, 'wb')
+        np.savez(f, shape=[self.width, self.height, self.start, self.goal],
+                 next_state=self.next_state, reward=self.reward)
+        f.close()
+
+    @staticmethod
+    def load(filename):
+        data = np.load(filename)
+        (width, height, start, goal) = [int(x) for x in data['shape']]
+        return Layout(width, height, start, goal, data['next_state'], data['reward'])
+
+def build_layout(width = GRID_WIDTH, height = GRID_HEIGHT):
+    """
+    Builds the MAB Grid World at the given size. The agent starts at the
+    left-most center square and the goal is the right-most center square.
+    """
+    (gx, gy) = (width - 1, int(height / 2))
+    next_state = np.zeros((width * height, len(ACTION_NAMES)), dtype=int)
+    reward = np.zeros((width * height, len(ACTION_NAMES)), dtype=int)
+    for x in range(width):
+        for y in range(height):
+            s = y * width + x
+            # Up
+            if y == 0:
+                next_state[s,UP] = s
+                reward[s,UP] = WALL_PENALTY
+            else:
+                next_state[s,UP] = s - width
+                if x == gx and y == gy+1:
+                    reward[s,UP] = GOAL_REWARD
+            # Right
+            if x == width - 1:
+                next_state[s,RIGHT] = s
+                reward[s,RIGHT] = WALL_PENALTY
+            else:
+                next_state[s,RIGHT] = s + 1
+                if x == gx-1 and y == gy:
+                    reward[s,RIGHT] = GOAL_REWARD - 1
+                # Handle the special transition rewards
+                elif x == width - 2:
+                    reward[s,RIGHT] = -1 if y == 0 else 3
+            # Down
+            if y == height - 1:
+                next_state[s,DOWN] = s
+                reward[s,DOWN] = WALL_PENALTY
+            else:
+                next_state[s,DOWN] = s + width
+                if x == gx and y == gy-1:
+                    reward[s,DOWN] = GOAL_REWARD
+    return Layout(width, height, gy * width, gy * width + gx, next_state, reward)
+
+def parse_layout(text):
+    """
+    Parses an ASCII layout spec. See the module docstring for the format.
+    """
+    wall_penalty = WALL_PENALTY
+    goal_reward = GOAL_REWARD
+    rows = []
+    overrides = []
+    for line in text.splitlines():
+        line = line.split('#')[0].strip()
+        if not line:
+            continue
+        tokens = line.split()
+        if tokens[0] == 'wall_penalty':
+            wall_penalty = float(tokens[1])
+        elif tokens[0] == 'goal_reward':
+            goal_reward = float(tokens[1])
+        elif tokens[0] == 'reward':
+            overrides.append((int(tokens[1]), int(tokens[2]), ACTION_NAMES.index(tokens[3]), float(tokens[4])))
+        elif all(c in '.SGX' for c in line):
+            rows.append(line)
+        else:
+            raise ValueError('Unrecognized layout line: {0}'.format(line))
+    if len(rows) == 0 or any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError('Layout grid must be a non-empty rectangle')
+    (width, height) = (len(rows[0]), len(rows))
+    cells = ''.join(rows)
+    if cells.count('S') != 1 or cells.count('G') != 1:
+        raise ValueError('Layout grid must have exactly one start and one goal')
+    start = cells.index('S')
+    goal = cells.index('G')
+    next_state = np.zeros((width * height, len(ACTION_NAMES)), dtype=int)
+    reward = np.zeros((width * height, len(ACTION_NAMES)))
+    for x in range(width):
+        for y in range(height):
+            s = y * width + x
+            for action,(dx,dy) in enumerate(MOVES):
+                (nx, ny) = (x + dx, y + dy)
+                if nx < 0 or nx >= width or ny < 0 or ny >= height or rows[ny][nx] == 'X':
+                    next_state[s,action] = s
+                    reward[s,action] = wall_penalty
+                else:
+                    next_state[s,action] = ny * width + nx
+                    if next_state[s,action] == goal:
+                        reward[s,action] = goal_reward
+    for (x, y, action, r) in overrides:
+        reward[y * width + x, action] = r
+    if np.all(reward == np.round(reward)):
+        reward = reward.astype(int)
+    return Layout(width, height, start, goal, next_state, reward)
+
+def load_layout(filename):
+    """
+    Loads an ASCII layout spec, using the compiled copy in <filename>.npz
+    when it is newer than the spec.
+    """
+    compiled = filename + '.npz'
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= os.path.getmtime(filename):
+        return Layout.load(compiled)
+    f = open(filename, 'r')
+    layout = parse_layout(f.read())
+    f.close()
+    layout.save(compiled)
+    return layout
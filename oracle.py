@@ -0,0 +1,162 @@
+"""
+Exact optimal values for a grid world whose bandits are known.
+
+Given the bandits' partitions, picking a bandit in a state is an ordinary MDP
+action: bandit k moves UP with probability first, RIGHT with probability
+second - first and DOWN with probability 1 - second. An episode ends at the
+goal or after max_moves, so the optimal values come from finite-horizon value
+iteration over the layout's transition and reward arrays:
+
+    Q_h(s, k) = sum_a P[k, a] * (reward[s, a] + V_{h-1}(next_state[s, a]))
+    V_h(s) = max_k Q_h(s, k)
+
+Each sweep is one (S, 3) by (3, K) product. A bandit's value in any state is
+linear in its action probabilities, so only bandits on the convex hull of
+those probabilities can ever be optimal, and the rest are dropped before
+iterating. That keeps thousands of bandits down to a handful.
+"""
+import numpy as np
+from layout import *
+
+# Largest layout whose policies are evaluated by squaring a dense transition
+# matrix rather than stepping through the horizon
+DENSE_STATES = 64
+
+def action_probabilities(bandits):
+    """
+    Returns the (K, 3) array of UP, RIGHT and DOWN probabilities for a list
+    of Bandits.
+    """
+    first = np.array([b.first for b in bandits])
+    second = np.array([b.second for b in bandits])
+    return np.column_stack((first, second - first, 1 - second))
+
+def hull_bandits(probs):
+    """
+    Returns the indices of the bandits on the convex hull of their action
+    probabilities. Every linear objective is maximized by one of them.
+    """
+    if len(probs) < 3:
+        return np.arange(len(probs))
+    (x, y) = (probs[:,UP], probs[:,RIGHT])
+    order = np.lexsort((y, x)).tolist()
+    def cross(o, a, b):
+        return (x[a] - x[o]) * (y[b] - y[o]) - (y[a] - y[o]) * (x[b] - x[o])
+    # Andrew's monotone chain
+    lower = []
+    for i in order:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], i) <= 0:
+            lower.pop()
+        lower.append(i)
+    upper = []
+    for i in reversed(order):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], i) <= 0:
+            upper.pop()
+        upper.append(i)
+    return np.unique(lower[:-1] + upper[:-1])
+
+def value_iteration(layout, probs, horizon = 100, policy = False):
+    """
+    Returns the optimal expected return of every state with horizon moves
+    left, as an (S,) array. With policy, also returns the (horizon, S) array
+    of optimal bandits, where row h is the bandit to pick with h + 1 moves
+    left.
+    """
+    hull = hull_bandits(probs)
+    p = probs[hull].T
+    reward = layout.reward.astype(np.float64)
+    v = np.zeros(layout.num_states)
+    choices = np.zeros((horizon, layout.num_states), dtype=np.int32) if policy else None
+    for h in range(horizon):
+        q = (reward + v[layout.next_state]).dot(p)
+        best = q.argmax(axis=1)
+        v = q[np.arange(layout.num_states), best]
+        # Episodes end on reaching the goal
+        v[layout.goal] = 0
+        if policy:
+            choices[h] = hull[best]
+    if policy:
+        return (v, choices)
+    return v
+
+def optimal_value(world):
+    """
+    Returns the optimal expected score of an episode of a GridWorld.
+    """
+    probs = action_probabilities(world.bandits)
+    return value_iteration(world.layout, probs, world.max_moves)[world.layout.start]
+
+def policy_moves(policy, probs):
+    """
+    Returns the (..., S, 3) distribution over moves in every state, given the
+    (..., S, K) probability of picking each bandit in every state and the
+    (..., K, 3) action probabilities of the bandits.
+    """
+    return np.matmul(policy, probs)
+
+def markov_chain(layout, moves):
+    """
+    Returns the (..., S, S) transition matrix of a policy, given its
+    (..., S, 3) move distribution. The goal is absorbing with no way out.
+    """
+    chain = np.zeros(moves.shape[:-1] + (layout.num_states,))
+    states = np.arange(layout.num_states)
+    # Each action leads every state to one successor, so the moves can be
+    # added one action at a time
+    for a in range(moves.shape[-1]):
+        chain[..., states, layout.next_state[:,a]] += moves[..., a]
+    chain[..., layout.goal, :] = 0
+    return chain
+
+def horizon_sum(chain, reward, horizon):
+    """
+    Returns the sum of chain^h reward over h < horizon, using repeated
+    squaring, so it takes O(log horizon) matrix products.
+    """
+    # (power, block) is (chain^k, sum of chain^h reward for h < k), and
+    # (shift, total) is the same for the bits of horizon consumed so far
+    power = chain
+    block = reward[..., None]
+    shift = None
+    total = np.zeros(block.shape)
+    while horizon:
+        if horizon & 1:
+            total = total + (block if shift is None else np.matmul(shift, block))
+            shift = power if shift is None else np.matmul(shift, power)
+        horizon >>= 1
+        if horizon:
+            block = block + np.matmul(power, block)
+            power = np.matmul(power, power)
+    return total[..., 0]
+
+def evaluate_policy(layout, moves, horizon = 100):
+    """
+    Returns the exact expected return of a policy from every state, given its
+    (..., S, 3) move distribution in every state. Leading dimensions are
+    evaluated independently, e.g. one policy per world.
+
+    With a horizon, episodes end at the goal or after horizon moves and the
+    values come from the finite-horizon recursion. With horizon None,
+    episodes run until the goal and the values come from a linear solve over
+    the absorbing Markov chain, which must reach the goal from every state.
+    """
+    reward = (moves * layout.reward).sum(axis=-1)
+    reward[..., layout.goal] = 0
+    if horizon is None:
+        chain = markov_chain(layout, moves)
+        return np.linalg.solve(np.eye(layout.num_states) - chain, reward[..., None])[..., 0]
+    if layout.num_states <= DENSE_STATES:
+        return horizon_sum(markov_chain(layout, moves), reward, horizon)
+    v = np.zeros(reward.shape)
+    for h in range(horizon):
+        v = reward + (moves * v[..., layout.next_state]).sum(axis=-1)
+        v[..., layout.goal] = 0
+    return v
+
+def policy_value(world, policy):
+    """
+    Returns the exact expected score of an episode of a GridWorld when its
+    bandits are picked by the given (S, K) policy.
+    """
+    moves = policy_moves(policy, action_probabilities(world.bandits))
+    return evaluate_policy(world.layout, moves, world.max_moves)[world.layout.start]
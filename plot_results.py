@@ -1,27 +1,34 @@
+"""
+Aggregates the trials of one experiment and plots its average learning curves.
+
+    python plot_results.py <results_dir or results.cube> <graph_title>
+
+writes <name>_average.csv, <name>_stdev.csv and <name>_stderr.csv, and plots
+<name>.png.
+
+A results directory keeps its running aggregate in a .aggregate sidecar,
+alongside a manifest of the size and mtime of every trial file it has read and
+how far. Each run only reads trial files that are new or have grown since,
+and only their new rows, so refreshing the plots of a running sweep costs time
+in proportion to the new results. If a trial file is removed or rewritten,
+the aggregate is rebuilt from scratch.
+
+An experiment already loaded into a results store by resultsdb.py is plotted
+straight from the store:
+
+    python plot_results.py --db results.db <experiment name> <graph_title>
+"""
 import csv
 import os
-from math import sqrt
-import matplotlib.pyplot as plt
-import numpy as np
 import sys
+import zlib
+import cPickle as pickle
+import numpy as np
+from stats import RunningStats, parse_rows
+from cube import CUBE_SUFFIX, open_cube, completed_rows
 
-def initialize_results(filename):
-    f = open(filename, 'r')
-    reader = csv.reader(f)
-    initial_results = []
-    reader.next()
-    for row in reader:
-        initial_results.append([[] for _ in range(len(row))])
-    f.flush()
-    f.close()
-    return initial_results
-
-def get_headers(filename):
-    tempf = open(filename, 'r')
-    reader = csv.reader(tempf)
-    headers = reader.next()
-    tempf.close()
-    return headers
+# The running aggregate of a results directory, kept inside it
+AGGREGATE_FILE = '.aggregate'
 
 def write_results(filename, r):
     f = open(filename, 'wb')
@@ -31,70 +38,181 @@ def write_results(filename, r):
     f.flush()
     f.close()
     
-def aggregate_results():
-    results_dir = sys.argv[1]
-    if not results_dir.endswith('/'):
-        results_dir += '/'
-    setup = True
+
+def load_aggregate(results_dir):
+    filename = os.path.join(results_dir, AGGREGATE_FILE)
+    if not os.path.exists(filename):
+        return None
+    f = open(filename, 'rb')
+    state = pickle.load(f)
+    f.close()
+    return state
+
+def save_aggregate(results_dir, state):
+    # Written atomically, so an interrupted run leaves the old aggregate.
+    # Not compressed, since the running means barely compress.
+    filename = os.path.join(results_dir, AGGREGATE_FILE)
+    f = open(filename + '.tmp', 'wb')
+    pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    f.close()
+    os.rename(filename + '.tmp', filename)
+
+def fold_trial(state, results_dir, filename):
+    """
+    Adds the rows of one trial file that the aggregate has not seen yet.
+    Returns False if the file no longer starts with what was read before.
+    """
+    path = os.path.join(results_dir, filename)
+    stat = os.stat(path)
+    seen = state['files'].get(filename)
+    if seen is not None and (seen['size'], seen['mtime']) == (stat.st_size, stat.st_mtime):
+        return True
+    f = open(path, 'rb')
+    text = f.read()
+    f.close()
+    # A trial that is still running may end in a partly written row
+    end = text.rfind('\n') + 1
+    if seen is None:
+        header = text.find('\n') + 1
+        if header == 0:
+            return True
+        headers = text[:header].strip().split(',')
+        if state['headers'] is None:
+            state['headers'] = headers
+            state['name'] = " ".join(filename.replace(".csv", "").split('_')[:-1])
+        elif headers != state['headers']:
+            return False
+        seen = {'read': header, 'crc': zlib.crc32(text[:header]), 'rows': 0}
+    elif end < seen['read'] or zlib.crc32(text[:seen['read']]) != seen['crc']:
+        return False
+    data = parse_rows(text[seen['read']:end], len(state['headers']))
+    if len(data):
+        if state['stats'] is None:
+            state['stats'] = RunningStats(0, len(state['headers']))
+        state['stats'].add(data, seen['rows'])
+    state['files'][filename] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'read': end,
+                                'crc': zlib.crc32(text[:end]), 'rows': seen['rows'] + len(data)}
+    return True
+
+def aggregate_csv_results(results_dir, rebuild = False):
+    """
+    Brings the directory's aggregate up to date with its trial files and
+    returns (experiment_name, headers, stats, trials). The first run parses
+    every trial file (see stats.load_results); a sweep too large for that
+    should write a cube instead.
+    """
+    filenames = sorted(f for f in os.listdir(results_dir) if f.endswith('.csv'))
+    fold = lambda state: all(fold_trial(state, results_dir, filename) for filename in filenames)
+    state = None if rebuild else load_aggregate(results_dir)
+    manifest = dict(state['files']) if state is not None else None
+    # A trial that was removed or rewritten can't be taken back out of the
+    # aggregate, so the aggregate starts over
+    if state is not None and not (set(state['files']).issubset(filenames) and fold(state)):
+        state = None
+    if state is None:
+        state = {'name': None, 'headers': None, 'stats': None, 'files': {}}
+        # Stream over the trials one file at a time, so memory stays constant
+        if not fold(state):
+            raise ValueError('The trials in {0} have different series'.format(results_dir))
+    if state['stats'] is None:
+        raise ValueError('No results in {0}'.format(results_dir))
+    if state['files'] != manifest:
+        save_aggregate(results_dir, state)
+    # Trials that have only written their header so far don't count yet
+    trials = sum(1 for seen in state['files'].values() if seen['rows'])
+    return (state['name'], state['headers'], state['stats'], trials)
+
+def aggregate_cube_results(filename):
+    (header, data) = open_cube(filename)
+    stats = RunningStats(header['episodes'], len(header['series']))
+    episodes = np.arange(1, header['episodes'] + 1)
     trials = 0
-    for filename in os.listdir(results_dir):
-        if setup:
-            tokens = filename.replace(".csv", "").split('_')
-            experiment_name = ""
-            for i in range(len(tokens) - 1):
-                if i > 0:
-                    experiment_name += " "
-                experiment_name += tokens[i]
-            results = initialize_results(results_dir + filename)
-            headers = get_headers(results_dir + filename)
-            setup = False
-        filename = results_dir + filename
-        f = open(filename, 'r')
-        reader = csv.reader(f)
-        reader.next()
-        for i,row in enumerate(reader):
-            for j,val in enumerate(row):
-                results[i][j].append(float(val))
-        f.flush()
-        f.close()
-        trials += 1
-
-    avg = []
-    stdev = []
-    stderr = []
-    for row in results:
-        avg.append([])
-        stdev.append([])
-        stderr.append([])
-        for cell in row:
-            avg[-1].append(sum(cell) / len(cell))
-            stdev[-1].append(sqrt(sum([(x - avg[-1][-1])**2 for x in cell]) / (len(cell) - 1)))
-            stderr[-1].append(stdev[-1][-1] / sqrt(len(cell)))
-
-    write_results(experiment_name.replace(' ', '_') + '_average.csv', avg)
-    write_results(experiment_name.replace(' ', '_') + '_stdev.csv', stdev)
-    write_results(experiment_name.replace(' ', '_') + '_stderr.csv', stderr)
-    plot(sys.argv[1], experiment_name, avg, stdev, stderr, trials, headers)
-    
-def transpose_results(results):
-    t = [[] for _ in range(len(results[0]))]
-    for row in results:
-        for i,cell in enumerate(row):
-            t[i].append(cell)
-    return t
+    # Each trial is read straight out of the mapped file
+    for trial in data:
+        n = completed_rows(trial)
+        if n > 0:
+            stats.add(np.column_stack((episodes[:n], trial[:n])))
+            trials += 1
+    return (header['name'], header['series'], stats, trials)
+
+def aggregate_results(source, rebuild = False):
+    """
+    Aggregates a results directory or cube and writes its average, stdev and
+    stderr CSVs. Returns (experiment_name, headers, stats, trials). With
+    rebuild, a results directory's aggregate is recomputed from scratch.
+    """
+    if source.endswith(CUBE_SUFFIX):
+        (experiment_name, headers, stats, trials) = aggregate_cube_results(source)
+    else:
+        (experiment_name, headers, stats, trials) = aggregate_csv_results(source, rebuild)
+
+    write_results(experiment_name.replace(' ', '_') + '_average.csv', stats.mean.tolist())
+    write_results(experiment_name.replace(' ', '_') + '_stdev.csv', stats.stdev().tolist())
+    write_results(experiment_name.replace(' ', '_') + '_stderr.csv', stats.stderr().tolist())
+    return (experiment_name, headers, stats, trials)
+
+def plot_results(source, graph_title, **options):
+    (experiment_name, headers, stats, trials) = aggregate_results(source)
+    plot(graph_title, experiment_name, stats.mean, stats.stdev(), stats.stderr(), trials, headers, **options)
     
-def plot(graph_title, experiment_name, avg, stdev, stderr, trials, series):
-    avg = [np.array(x) for x in transpose_results(avg)]
-    stdev = [np.array(x) for x in transpose_results(stdev)]
-    stderr = [np.array(x) for x in transpose_results(stderr)]
+def plot_db_results(db_file, experiment_name, graph_title, params = None, **options):
+    import resultsdb
+    db = resultsdb.connect(db_file)
+    (headers, avg, stdev, stderr, trials) = resultsdb.episode_stats(db, experiment_name, params)
+    db.close()
+    plot(graph_title, experiment_name, avg, stdev, stderr, trials, headers, **options)
+
+def render_figure(job):
+    """
+    Aggregates and plots one source in a worker process.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    (source, graph_title, db_file, params, options) = job
+    if db_file:
+        plot_db_results(db_file, source, graph_title, params, **options)
+    else:
+        plot_results(source, graph_title, **options)
+    return source
+
+def render_figures(sources, graph_title, db_file = None, params = None, workers = None, **options):
+    """
+    Plots every source, each in its own worker process, and prints each one
+    as it finishes. With db_file, the sources are experiments in that
+    results store.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    executor = ProcessPoolExecutor(max_workers = workers or min(len(sources), multiprocessing.cpu_count()))
+    try:
+        futures = [executor.submit(render_figure, (source, graph_title, db_file, params, options))
+                   for source in sources]
+        for future in as_completed(futures):
+            print "Plotted {0}".format(future.result())
+    finally:
+        executor.shutdown()
+
+def plot(graph_title, experiment_name, avg, stdev, stderr, trials, series, points = None, smooth = 0, method = 'lttb'):
+    """
+    Plots the average curve of every series with its standard error band.
+    Curves can be smoothed by a trailing moving average over smooth episodes,
+    and downsampled to about points points (see downsample.py).
+    """
+    import matplotlib.pyplot as plt
+    from downsample import downsample, moving_average
+    avg = avg.T
+    stdev = stdev.T
+    stderr = stderr.T
     colors = ['blue','red','yellow', 'green', 'orange', 'purple', 'brown'] # max 7 lines
     ax = plt.subplot(111)
     for i in range(1,len(avg)):
-        plt.plot(avg[0], avg[i], label=series[i], color=colors[i-1])
-        plt.fill_between(avg[0], avg[i] + stderr[i], avg[i] - stderr[i], facecolor=colors[i-1], alpha=0.2)
+        (x, y, err) = downsample(avg[0], moving_average(avg[i], smooth), moving_average(stderr[i], smooth),
+                                 points, method)
+        plt.plot(x, y, label=series[i], color=colors[i-1])
+        plt.fill_between(x, y + err, y - err, facecolor=colors[i-1], alpha=0.2)
     plt.xlabel(series[0])
     # Note the code below is experiment-specific
-    plt.ylabel('Score')
+    plt.ylabel('Score' if smooth <= 1 else 'Score ({0}-episode moving average)'.format(smooth))
     plt.title('{0}\n({1}, {2} trials)'.format(graph_title, experiment_name, trials))
     # Shink current axis by 20%
     box = ax.get_position()
@@ -102,12 +220,19 @@ def plot(graph_title, experiment_name, avg, stdev, stderr, trials, series):
     # Put a legend to the right of the current axis
     ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
     plt.savefig('{0}.png'.format(experiment_name.replace(' ', '_')))
+    plt.close()
         
-if len(sys.argv) != 3:
-    print "Format: python plot_results.py <results_dir> <graph_title>"
-    exit(1)
-print "Plotting {0} {1}".format(sys.argv[1], sys.argv[2])
-aggregate_results()
-        
-        
+def main(argv = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 4 and argv[0] == '--db':
+        print "Plotting {0} {1}".format(argv[2], argv[3])
+        plot_db_results(argv[1], argv[2], argv[3])
+        return
+    if len(argv) != 2:
+        print "Format: python plot_results.py [--db results.db] <results_dir, results.cube or experiment> <graph_title>"
+        exit(1)
+    print "Plotting {0} {1}".format(argv[0], argv[1])
+    plot_results(argv[0], argv[1])
 
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,101 @@
+"""
+Plots the final average score of every agent against the number of bandits,
+from the <K>_bandits_average.csv files that plot_results.py writes.
+
+    python plot_summary.py <graph_title>
+
+With --db, the scores come from a results store instead (see resultsdb.py),
+covering every bandit count in it, averaged over the last --window episodes:
+
+    python plot_summary.py <graph_title> --db results.db [--window 100]
+"""
+import re
 import csv
-import os
-import matplotlib.pyplot as plt
 import sys
+import argparse
 
-bandits = [2, 3, 5, 10, 20, 50, 100]
+BANDITS = [2, 3, 5, 10, 20, 50, 100]
 headers = ['Episodes','TSTD(0)', 'Q-Learning']
 colors = ['blue','red','yellow', 'green', 'orange', 'purple', 'brown'] # max 7 lines
 fileformat = "{0}_bandits_average.csv"
 
-data = [[] for h in range(1,len(headers))]
-for bandit in bandits:
-    filename = fileformat.format(bandit)
-    f = open(filename, 'r')
-    reader = csv.reader(f)
-    last = reader.next()
-    for row in reader:
-        last = row
-    for i,v in enumerate(last):
-        if i > 0:
-            data[i-1].append(float(row[i]))
-
-ax = plt.subplot(111)
-for sidx,series in enumerate(data):
-    plt.plot(bandits, series, label=headers[sidx+1], color=colors[sidx])
-plt.xlabel("# Bandits")
-plt.ylabel('Final Score')
-plt.title(sys.argv[1])
-# Shink current axis by 20%
-box = ax.get_position()
-ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
-# Put a legend to the right of the current axis
-ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-plt.savefig('summary.png')
-plt.clf()
+def source_bandits(sources):
+    """
+    Returns the sorted bandit counts of results directories or cubes named
+    the way sweeps name them, e.g. 2_bandits/results/.
+    """
+    bandits = set()
+    for source in sources:
+        match = re.search(r'(\d+)_bandits', source)
+        if match is None:
+            raise ValueError('{0} does not name a bandit count'.format(source))
+        bandits.add(int(match.group(1)))
+    return sorted(bandits)
+
+def final_scores(bandits = BANDITS):
+    """
+    Returns one list per agent of its final average score at each bandit
+    count.
+    """
+    data = [[] for h in range(1,len(headers))]
+    for bandit in bandits:
+        filename = fileformat.format(bandit)
+        f = open(filename, 'r')
+        reader = csv.reader(f)
+        last = reader.next()
+        for row in reader:
+            last = row
+        f.close()
+        # Any regret columns come after the agents' scores
+        for i in range(1,len(headers)):
+            data[i-1].append(float(last[i]))
+    return data
+
+def final_scores_db(db_file, window = 1, params = None):
+    """
+    Returns one (bandit counts, final scores) pair per agent from a results
+    store, with each score averaged over the last window episodes.
+    """
+    import resultsdb
+    db = resultsdb.connect(db_file)
+    means = resultsdb.final_window_means(db, window, params, headers[1:])
+    db.close()
+    return [means.get(h, ([], [])) for h in headers[1:]]
+
+def plot_summary(graph_title, bandits = BANDITS, db = None, window = 1, params = None):
+    import matplotlib.pyplot as plt
+    if db is None:
+        data = [(bandits, series) for series in final_scores(bandits)]
+    else:
+        data = final_scores_db(db, window, params)
+    ax = plt.subplot(111)
+    for sidx,(x, series) in enumerate(data):
+        plt.plot(x, series, label=headers[sidx+1], color=colors[sidx])
+    plt.xlabel("# Bandits")
+    plt.ylabel('Final Score')
+    plt.title(graph_title)
+    # Shink current axis by 20%
+    box = ax.get_position()
+    ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+    # Put a legend to the right of the current axis
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+    plt.savefig('summary.png')
+    plt.clf()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Plots the final score of each agent against the bandit count.')
+    parser.add_argument('title')
+    parser.add_argument('--bandits', type = int, nargs = '+', help = 'Bandit counts of the average CSVs to read')
+    parser.add_argument('--db', help = 'Read the scores from this results store instead')
+    parser.add_argument('--window', type = int, default = 1, help = 'Final episodes averaged, with --db')
+    parser.add_argument('--param', action = 'append', metavar = 'KEY=VALUE',
+                        help = 'Only experiments run with these parameters, with --db')
+    args = parser.parse_args(argv)
+    params = None
+    if args.param:
+        import resultsdb
+        params = resultsdb.parse_params(args.param)
+    plot_summary(args.title, args.bandits or BANDITS, args.db, args.window, params)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
-import random
-from itertools import product
+import numpy as np
 from gridworld import *
+from vecworld import VectorAgent
+from banditindex import GreedyIndex
 
 class QAgent(Agent):
     """
     A Q-Learning agent with optimistic initialization.
+
+    With index, the greedy bandit is found with a GreedyIndex instead of a
+    scan of the state's Q-values. Ties are still broken uniformly at random,
+    though not by the same draws as the scan.
     """
-    def __init__(self, num_bandits, epsilon = 0.1, decrease_epsilon = False, alpha = 0.05, decrease_alpha = False, gamma = 1):
-        Agent.__init__(self, num_bandits)
+    def __init__(self, num_bandits, epsilon = 0.1, decrease_epsilon = False, alpha = 0.05, decrease_alpha = False, gamma = 1, layout = None, dtype = np.float64, rng = None, index = False):
+        Agent.__init__(self, num_bandits, layout, rng)
+        self.dtype = dtype
         self.build_state_action_table()
         self.epsilon = epsilon
         self.alpha = alpha
@@ -17,16 +23,12 @@ class QAgent(Agent):
         self.episodes = 0
         self.starting_epsilon = epsilon
         self.starting_alpha = alpha
+        self.index = GreedyIndex(self.layout.num_states, num_bandits) if index else None
 
     def build_state_action_table(self):
-        self.q = {}
-        self.visits = {}
-        self.q_visits = {}
-        for sa in product(product(range(GRID_WIDTH), range(GRID_HEIGHT)), range(self.num_bandits)):
-            self.q[sa] = 0
-            self.q_visits[sa] = 0
-        for s in product(range(GRID_WIDTH), range(GRID_HEIGHT)):
-            self.visits[s] = 0
+        self.q = np.zeros((self.layout.num_states, self.num_bandits), dtype=self.dtype)
+        self.q_visits = np.zeros((self.layout.num_states, self.num_bandits), dtype=np.int32)
+        self.visits = np.zeros(self.layout.num_states, dtype=int)
 
     def episode_starting(self, state):
         self.state = state
@@ -34,7 +36,8 @@ class QAgent(Agent):
         
     def episode_over(self):
         if self.update:
-            self.q[(self.prev_state,self.prev_action)] += self.alpha * (self.prev_reward - self.q[(self.prev_state,self.prev_action)])
+            self.q[self.prev_state,self.prev_action] += self.alpha * (self.prev_reward - self.q[self.prev_state,self.prev_action])
+            self.q_changed()
         self.episodes += 1
         if self.decrease_alpha:
             self.alpha = min(self.starting_alpha, 20.0 / float(self.episodes+1))
@@ -42,46 +45,60 @@ class QAgent(Agent):
             self.epsilon = min(self.starting_epsilon, 100.0 / float(self.episodes+1))
 
     def get_bandit(self):
+        # One greedy evaluation serves both the TD target and the choice
+        (bandit, bval) = self.greedy()
         if self.update:
-            self.update_q()
-        if random.random() < self.epsilon:
-            self.update = True
-            bandit = random.randrange(0,self.num_bandits)
-        else:
-            self.update = True
-            (bandit, bval) = self.greedy()
+            self.update_q(bval)
+            if self.prev_state == self.state:
+                # The update changed the row we just chose from
+                (bandit, bval) = self.greedy()
+        if self.rng.random_sample() < self.epsilon:
+            bandit = self.rng.randint(0,self.num_bandits)
+        self.update = True
         self.prev_action = bandit
-        self.q_visits[(self.state,bandit)] += 1
+        self.q_visits[self.state,bandit] += 1
         return bandit
 
     def greedy(self,debug=False):
-        maxi = []
-        maxv = 0
-        for i in range(self.num_bandits):
-            bval = self.q[(self.state,i)]
-            if debug:
-                print '\tQ[s,{0}] = {1}'.format(ACTION_NAMES[i], bval)
-            if len(maxi) == 0 or bval > maxv:
-                maxi = [i]
-                maxv = bval
-            elif bval == maxv:
-                maxi.append(i)
+        bvals = self.q[self.state]
+        if self.index is not None and not debug:
+            return self.index.greedy(bvals, self.state, self.rng)
+        maxv = bvals.max()
+        maxi = np.flatnonzero(bvals == maxv)
         if len(maxi) == 1:
             maxi = maxi[0]
         else:
-            maxi = random.choice(maxi)
+            maxi = maxi[self.rng.randint(len(maxi))]
         if debug:
-            print '\tChoosing: {0}'.format(ACTION_NAMES[maxi])
+            for i,bval in enumerate(bvals):
+                print '\tQ[s,{0}] = {1}'.format(i, bval)
+            print '\tChoosing: {0}'.format(maxi)
         return (maxi,maxv)
 
+    def greedy_policy(self):
+        """
+        Returns the (num_states, num_bandits) probability that the greedy
+        policy picks each bandit in each state. Ties are split evenly, as
+        greedy breaks them at random.
+        """
+        best = self.q == self.q.max(axis=1)[:,None]
+        return best / best.sum(axis=1, keepdims=True).astype(np.float64)
+
     def set_state(self, state):
         self.prev_state = self.state
         self.state = state
         self.visits[state] += 1
 
-    def update_q(self):
-        target = self.prev_reward + self.gamma * self.greedy()[1] - self.q[(self.prev_state,self.prev_action)]
-        self.q[(self.prev_state,self.prev_action)] += self.alpha * (self.prev_reward + self.gamma * self.greedy()[1] - self.q[(self.prev_state,self.prev_action)])
+    def update_q(self, bval):
+        """
+        Backs up the previous transition given the greedy value of the current state.
+        """
+        self.q[self.prev_state,self.prev_action] += self.alpha * (self.prev_reward + self.gamma * bval - self.q[self.prev_state,self.prev_action])
+        self.q_changed()
+
+    def q_changed(self):
+        if self.index is not None:
+            self.index.update(self.q[self.prev_state], self.prev_state, self.prev_action)
 
     def observe_action(self, action):
         """
@@ -91,3 +108,90 @@ class QAgent(Agent):
 
     def observe_reward(self, r):
         self.prev_reward = r
+
+    def stats(self):
+        return {'alpha': self.alpha, 'epsilon': self.epsilon}
+
+class VectorQAgent(VectorAgent):
+    """
+    A population of independent Q-Learning agents, one per world. The Q
+    table is stored as a (num_worlds, num_states, num_bandits) array.
+    """
+    def __init__(self, num_worlds, num_bandits, epsilon = 0.1, decrease_epsilon = False, alpha = 0.05, decrease_alpha = False, gamma = 1, layout = None, dtype = np.float64, rng = None):
+        VectorAgent.__init__(self, num_worlds, num_bandits, layout, rng)
+        num_states = self.layout.num_states
+        self.q = np.zeros((num_worlds, num_states, num_bandits), dtype=dtype)
+        self.q_visits = np.zeros((num_worlds, num_states, num_bandits), dtype=np.int32)
+        self.visits = np.zeros((num_worlds, num_states), dtype=int)
+        self.update = np.zeros(num_worlds, dtype=bool)
+        self.prev_state = np.zeros(num_worlds, dtype=int)
+        self.prev_action = np.zeros(num_worlds, dtype=int)
+        self.prev_reward = np.zeros(num_worlds)
+        self.epsilon = epsilon
+        self.alpha = alpha
+        self.decrease_epsilon = decrease_epsilon
+        self.decrease_alpha = decrease_alpha
+        self.gamma = gamma
+        self.episodes = 0
+        self.starting_epsilon = epsilon
+        self.starting_alpha = alpha
+
+    def episode_starting(self, states):
+        self.state = states.copy()
+        self.update[:] = False
+
+    def episode_over(self):
+        idx = np.flatnonzero(self.update)
+        prev = (idx, self.prev_state[idx], self.prev_action[idx])
+        self.q[prev] += self.alpha * (self.prev_reward[idx] - self.q[prev])
+        self.episodes += 1
+        if self.decrease_alpha:
+            self.alpha = min(self.starting_alpha, 20.0 / float(self.episodes+1))
+        if self.decrease_epsilon:
+            self.epsilon = min(self.starting_epsilon, 100.0 / float(self.episodes+1))
+
+    def greedy_policy(self):
+        """
+        Returns the (num_worlds, num_states, num_bandits) probability that
+        each world's greedy policy picks each bandit in each state.
+        """
+        best = self.q == self.q.max(axis=2)[:,:,None]
+        return best / best.sum(axis=2, keepdims=True).astype(np.float64)
+
+    def get_bandit(self, idx):
+        # One greedy evaluation serves both the TD target and the choice
+        (bandit, bval) = self.greedy(idx)
+        pending = self.update[idx]
+        self.update_q(idx[pending], bval[pending])
+        # Worlds whose update changed the row we just chose from
+        redo = pending & (self.prev_state[idx] == self.state[idx])
+        bandit[redo] = self.greedy(idx[redo])[0]
+        explore = self.rng.random_sample(len(idx)) < self.epsilon
+        bandit[explore] = self.rng.randint(0, self.num_bandits, size=explore.sum())
+        self.update[idx] = True
+        self.prev_action[idx] = bandit
+        self.q_visits[idx, self.state[idx], bandit] += 1
+        return bandit
+
+    def greedy(self, idx):
+        """
+        Returns the greedy bandit and its value for every world in idx,
+        breaking ties uniformly at random.
+        """
+        bvals = self.q[idx, self.state[idx]]
+        maxv = bvals.max(axis=1)
+        ties = bvals == maxv[:,None]
+        maxi = (ties * self.rng.random_sample(bvals.shape)).argmax(axis=1)
+        return (maxi, maxv)
+
+    def set_state(self, idx, states):
+        self.prev_state[idx] = self.state[idx]
+        self.state[idx] = states
+        self.visits[idx, states] += 1
+
+    def update_q(self, idx, bval):
+        prev = (idx, self.prev_state[idx], self.prev_action[idx])
+        self.q[prev] += self.alpha * (self.prev_reward[idx] + self.gamma * bval - self.q[prev])
+
+    def observe_reward(self, idx, r):
+        self.prev_reward[idx] = r
@@ -0,0 +1,258 @@
+"""
+An SQLite store for the results of many experiments.
+
+Every score of every trial is one row, keyed by experiment, series, episode
+and trial:
+
+    experiments(id, name, bandits, params, episodes)   params is a JSON object
+    series(id, experiment, name)                       e.g. 'TSTD(0)', 'Q-Learning'
+    scores(experiment, series, episode, trial, score)
+
+Scores are clustered by (experiment, series, episode), so the last episodes
+of a series are one contiguous range, and a query over a final window reads
+only that window. Results directories and cubes are bulk loaded with
+
+    python resultsdb.py results.db 2_bandits/results/ 3_bandits/results/ [--param epsilon=0.1]
+
+and plot_results.py and plot_summary.py read from the store with --db.
+Loading a trial again replaces its scores.
+"""
+import os
+import re
+import json
+import sqlite3
+import argparse
+import numpy as np
+from stats import RunningStats, load_results
+from cube import CUBE_SUFFIX, open_cube, completed_rows
+
+# Episodes read from the store at a time when aggregating
+EPISODE_BLOCK = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    bandits INTEGER,
+    params TEXT NOT NULL,
+    episodes INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (name, params));
+CREATE INDEX IF NOT EXISTS experiments_bandits ON experiments (bandits, params);
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    experiment INTEGER NOT NULL REFERENCES experiments (id),
+    name TEXT NOT NULL,
+    UNIQUE (experiment, name));
+CREATE TABLE IF NOT EXISTS scores (
+    experiment INTEGER NOT NULL,
+    series INTEGER NOT NULL,
+    episode INTEGER NOT NULL,
+    trial INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (experiment, series, episode, trial)) WITHOUT ROWID;
+"""
+
+def connect(filename):
+    """
+    Opens a results store, creating its tables if needed.
+    """
+    db = sqlite3.connect(filename)
+    db.executescript(SCHEMA)
+    return db
+
+def format_params(params = None):
+    """
+    Returns the canonical JSON text of a parameter dict, so equal parameters
+    always match.
+    """
+    return json.dumps(params or {}, sort_keys = True)
+
+def parse_params(pairs):
+    """
+    Turns ['epsilon=0.1', 'agent=q'] into a parameter dict. Values are read
+    as JSON when they can be, and kept as strings otherwise.
+    """
+    params = {}
+    for pair in pairs or []:
+        (key, value) = pair.split('=', 1)
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+def experiment_bandits(name):
+    match = re.search(r'(\d+)[ _]bandits', name)
+    return int(match.group(1)) if match else None
+
+def experiment_id(db, name, params = None, bandits = None):
+    """
+    Returns the id of an experiment, adding it if it is new.
+    """
+    params = format_params(params)
+    row = db.execute('SELECT id FROM experiments WHERE name = ? AND params = ?', (name, params)).fetchone()
+    if row is not None:
+        return row[0]
+    if bandits is None:
+        bandits = experiment_bandits(name)
+    return db.execute('INSERT INTO experiments (name, bandits, params) VALUES (?, ?, ?)',
+                      (name, bandits, params)).lastrowid
+
+def series_ids(db, experiment, names):
+    ids = []
+    for name in names:
+        db.execute('INSERT OR IGNORE INTO series (experiment, name) VALUES (?, ?)', (experiment, name))
+        ids.append(db.execute('SELECT id FROM series WHERE experiment = ? AND name = ?',
+                              (experiment, name)).fetchone()[0])
+    return ids
+
+def insert_scores(db, experiment, series, trials, data):
+    """
+    Inserts a (trials, episodes, series) array of scores, with NaN marking
+    episodes a trial has not played. Rows go in in key order, which keeps the
+    bulk load appending to the table rather than splitting pages.
+    """
+    (num_trials, episodes) = data.shape[:2]
+    episode = np.repeat(np.arange(1, episodes + 1), num_trials)
+    trial = np.tile(np.asarray(trials), episodes)
+    for s,sid in enumerate(series):
+        score = data[:,:,s].T.ravel()
+        played = ~np.isnan(score)
+        rows = zip([experiment] * played.sum(), [sid] * played.sum(), episode[played].tolist(),
+                   trial[played].tolist(), score[played].tolist())
+        db.executemany('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)', rows)
+    db.execute('UPDATE experiments SET episodes = max(episodes, ?) WHERE id = ?', (episodes, experiment))
+
+def ingest_csv_results(db, results_dir, params = None, bandits = None):
+    """
+    Loads a directory of <name>_<trial>.csv files, one file at a time, so
+    memory stays constant. Trials that have no rows yet are skipped. Returns
+    the experiment name and the number of trials loaded.
+    """
+    filenames = sorted(f for f in os.listdir(results_dir) if f.endswith('.csv'))
+    if not filenames:
+        return (None, 0)
+    name = ' '.join(filenames[0].replace('.csv', '').split('_')[:-1])
+    (columns, loaded) = (None, 0)
+    for filename in filenames:
+        (headers, data) = load_results(os.path.join(results_dir, filename))
+        if len(data) == 0:
+            # Just created by a trial that is still running
+            continue
+        if columns is None:
+            experiment = experiment_id(db, name, params, bandits)
+            (columns, series) = (headers, series_ids(db, experiment, headers[1:]))
+        elif headers != columns:
+            raise ValueError('The trials in {0} have different series'.format(results_dir))
+        trial = int(filename.replace('.csv', '').split('_')[-1])
+        insert_scores(db, experiment, series, [trial], data[None,:,1:])
+        loaded += 1
+    return (name, loaded)
+
+def ingest_cube_results(db, filename, params = None, bandits = None):
+    (header, data) = open_cube(filename)
+    trials = [t for t in range(len(data)) if completed_rows(data[t]) > 0]
+    experiment = experiment_id(db, header['name'], params, bandits)
+    insert_scores(db, experiment, series_ids(db, experiment, header['series'][1:]), trials,
+                  np.asarray(data[trials], dtype=np.float64))
+    return (header['name'], len(trials))
+
+def ingest(db, source, params = None, bandits = None):
+    """
+    Loads a results directory or cube in one transaction. Returns the
+    experiment name and the number of trials loaded.
+    """
+    with db:
+        if source.endswith(CUBE_SUFFIX):
+            return ingest_cube_results(db, source, params, bandits)
+        return ingest_csv_results(db, source, params, bandits)
+
+def find_experiment(db, name, params = None):
+    """
+    Returns the (id, episodes) of an experiment. Without params, the name
+    alone has to pick out one experiment.
+    """
+    if params is None:
+        rows = db.execute('SELECT id, episodes FROM experiments WHERE name = ?', (name,)).fetchall()
+        if len(rows) > 1:
+            raise KeyError('{0} experiments are named {1}; pick one by its params'.format(len(rows), name))
+    else:
+        rows = db.execute('SELECT id, episodes FROM experiments WHERE name = ? AND params = ?',
+                          (name, format_params(params))).fetchall()
+    if not rows:
+        raise KeyError('No experiment {0} with params {1}'.format(name, format_params(params)))
+    return rows[0]
+
+def episode_stats(db, name, params = None):
+    """
+    Returns (headers, mean, stdev, stderr, trials) for an experiment, laid
+    out like plot_results.py's aggregates: one row per episode, with the
+    episode number in the first column. The trials are streamed through the
+    same Welford accumulator, a block of episodes at a time.
+    """
+    (experiment, episodes) = find_experiment(db, name, params)
+    series = db.execute('SELECT id, name FROM series WHERE experiment = ? ORDER BY id', (experiment,)).fetchall()
+    # Every trial has a first episode, and finding them reads one key range
+    trials = [row[0] for row in db.execute('SELECT trial FROM scores WHERE experiment = ? AND series = ? '
+                                           'AND episode = 1 ORDER BY trial', (experiment, series[0][0]))] if series else []
+    slot = dict((trial, t) for t,trial in enumerate(trials))
+    stats = RunningStats(episodes, len(series) + 1)
+    # Trials whose played prefix ended in an earlier block
+    ended = np.zeros(len(trials), dtype=bool)
+    for start in range(0, episodes, EPISODE_BLOCK):
+        end = min(start + EPISODE_BLOCK, episodes)
+        block = np.full((len(trials), end - start, len(series) + 1), np.nan)
+        block[:,:,0] = np.arange(start + 1, end + 1)
+        for s,(sid, _) in enumerate(series):
+            rows = np.array(db.execute('SELECT episode, trial, score FROM scores WHERE experiment = ? AND series = ? '
+                                       'AND episode > ? AND episode <= ?', (experiment, sid, start, end)).fetchall())
+            if len(rows):
+                index = [slot[t] for t in rows[:,1].astype(int)]
+                block[index, rows[:,0].astype(int) - start - 1, s + 1] = rows[:,2]
+        # A trial counts up to its first episode with a missing score, like a
+        # trial file that stops early
+        missing = np.isnan(block[:,:,1:]).any(axis=2)
+        for t in np.flatnonzero(~ended):
+            played = missing[t].argmax() if missing[t].any() else end - start
+            if played:
+                stats.add(block[t,:played], start)
+            ended[t] = played < end - start
+    return (['Episodes'] + [n for (_, n) in series], stats.mean, stats.stdev(), stats.stderr(), len(trials))
+
+def final_window_means(db, window = 1, params = None, series = None):
+    """
+    Returns {series name: ([bandit counts], [means])} holding each
+    experiment's mean score over its last window episodes, ordered by bandit
+    count. Only experiments with the given params count, and series limits
+    the result to those series.
+    """
+    rows = db.execute('SELECT e.bandits, s.name, AVG(sc.score) FROM experiments e '
+                      'JOIN series s ON s.experiment = e.id '
+                      'JOIN scores sc ON sc.experiment = e.id AND sc.series = s.id '
+                      'WHERE e.params = ? AND e.bandits IS NOT NULL AND sc.episode > e.episodes - ? '
+                      'GROUP BY e.id, s.id ORDER BY e.bandits', (format_params(params), window)).fetchall()
+    means = {}
+    for (bandits, name, mean) in rows:
+        if series is None or name in series:
+            means.setdefault(name, ([], []))
+            means[name][0].append(bandits)
+            means[name][1].append(mean)
+    return means
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Loads results directories and cubes into an SQLite store.')
+    parser.add_argument('db', help = 'SQLite file, created if it does not exist')
+    parser.add_argument('sources', nargs = '+', help = 'Results directories or cubes')
+    parser.add_argument('--param', action = 'append', metavar = 'KEY=VALUE',
+                        help = 'Parameters the experiments were run with, e.g. epsilon=0.1')
+    parser.add_argument('--bandits', type = int, help = 'Bandit count, if it is not in the experiment names')
+    args = parser.parse_args(argv)
+    db = connect(args.db)
+    params = parse_params(args.param)
+    for source in args.sources:
+        (name, trials) = ingest(db, source, params, args.bandits)
+        print "Loaded {0} trials of {1} from {2}".format(trials, name, source)
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Successive-halving and Hyperband search over agent constructor arguments.
+
+Configurations of a QAgent's or TSTDAgent's arguments are sampled from a
+search space, and each is played on the same trial seeds (so every
+configuration sees the same bandits) for a short budget of episodes. Only
+the best 1/eta of them are promoted, and promoted configurations keep
+playing from where they stopped, up to eta times the budget, until the
+survivors reach the full budget:
+
+    python search.py qlearning --configs 27 --min-episodes 100 --max-episodes 2700
+
+With --hyperband, several brackets of successive halving are run, trading
+more configurations at a small budget against fewer at a larger one.
+
+A configuration's score is its mean score over the last --window episodes it
+played, averaged over trials. The scores are the same as experiment.py's:
+Q-learning by the exact value of its greedy policy, and TSTD(0) by the
+episodes it played.
+"""
+import math
+import json
+import argparse
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Each argument is sampled log-uniformly, uniformly or from a list of choices
+SPACES = {
+    'qlearning': {'epsilon': ('log', 0.01, 0.3), 'alpha': ('log', 0.01, 0.5),
+                  'decrease_epsilon': ('choice', [False, True]), 'decrease_alpha': ('choice', [False, True])},
+    'tstd': {'alpha': ('uniform', 0.1, 1.0), 'decrease_alpha': ('choice', [True, False])},
+}
+
+def sample_config(space, rng):
+    config = {}
+    for name in sorted(space):
+        kind = space[name][0]
+        if kind == 'log':
+            config[name] = float(np.exp(rng.uniform(np.log(space[name][1]), np.log(space[name][2]))))
+        elif kind == 'uniform':
+            config[name] = float(rng.uniform(space[name][1], space[name][2]))
+        else:
+            choices = space[name][1]
+            config[name] = choices[rng.randint(len(choices))]
+    return config
+
+class Candidate(object):
+    """
+    One configuration, its trials so far and its latest score.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.trials = None
+        self.episodes = 0
+        self.score = None
+
+def make_agent(name, config, bandits, layout, seed):
+    from gridworld import make_rng, AGENT_STREAM
+    import qlearning
+    import tstd
+    if name == 'qlearning':
+        return qlearning.QAgent(bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 1), **config)
+    return tstd.TSTDAgent(bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 0), **config)
+
+def advance(job):
+    """
+    Plays one configuration's trials up to a new episode budget. Returns
+    (score, trials), where trials holds every (world, agent) pair so a
+    promoted configuration can carry on from here.
+    """
+    (name, config, trials, bandits, layout, seeds, start, episodes, window) = job
+    from gridworld import GridWorld
+    import oracle
+    if trials is None:
+        trials = []
+        for seed in seeds:
+            agent = make_agent(name, config, bandits, layout, seed)
+            trials.append(GridWorld(num_bandits = bandits, agent = agent, layout = layout, seed = seed))
+    window = min(window, episodes - start)
+    scores = np.zeros((len(trials), window))
+    for t,world in enumerate(trials):
+        for ep in range(start, episodes):
+            score = world.play_episode()
+            if ep >= episodes - window:
+                if name == 'qlearning':
+                    score = oracle.policy_value(world, world.agent.greedy_policy())
+                scores[t, ep - episodes + window] = score
+    return (scores.mean(), trials)
+
+def successive_halving(candidates, min_episodes, max_episodes, eta, run):
+    """
+    Promotes the best 1/eta of the candidates at each budget, multiplying the
+    budget by eta, until it reaches max_episodes. Returns the survivors of
+    the last rung, best first, and every (config, episodes, score) evaluated.
+    """
+    history = []
+    budget = min_episodes
+    while True:
+        run(candidates, budget)
+        candidates.sort(key = lambda c: c.score, reverse = True)
+        for c in candidates:
+            history.append({'config': c.config, 'episodes': budget, 'score': c.score})
+        print '{0} configs at {1} episodes, best {2:.3f}: {3}'.format(len(candidates), budget, candidates[0].score,
+                                                                   json.dumps(candidates[0].config, sort_keys = True))
+        if budget >= max_episodes:
+            return (candidates, history)
+        candidates = candidates[:max(1, len(candidates) // eta)]
+        budget = min(budget * eta, max_episodes)
+
+def hyperband(sample, min_episodes, max_episodes, eta, run):
+    """
+    Runs Hyperband's brackets of successive halving, from many configurations
+    at min_episodes down to a few that start at max_episodes. Returns the
+    best candidate and every evaluation.
+    """
+    rungs = int(math.floor(math.log(float(max_episodes) / min_episodes, eta) + 1e-9))
+    best = None
+    history = []
+    for s in range(rungs, -1, -1):
+        configs = int(math.ceil((rungs + 1) * eta**s / float(s + 1)))
+        budget = max(min_episodes, int(max_episodes / eta**s))
+        print 'Bracket {0}: {1} configs from {2} episodes'.format(rungs - s, configs, budget)
+        (survivors, evaluated) = successive_halving([Candidate(sample()) for _ in range(configs)],
+                                                    budget, max_episodes, eta, run)
+        history += evaluated
+        if best is None or survivors[0].score > best.score:
+            best = survivors[0]
+    return (best, history)
+
+def search(name, configs = 27, min_episodes = 100, max_episodes = 2700, eta = 3, bandits = 10, trials = 5,
+           window = 100, layout = None, seed = 0, workers = None, use_hyperband = False):
+    """
+    Searches the constructor arguments of agent name ('qlearning' or
+    'tstd'). Returns the best Candidate and the history of every evaluation.
+    """
+    from sweep import trial_seed
+    if layout is None:
+        from layout import build_layout
+        layout = build_layout()
+    rng = np.random.RandomState(seed)
+    seeds = [trial_seed(seed, trial) for trial in range(trials)]
+    executor = ProcessPoolExecutor(max_workers = workers or multiprocessing.cpu_count())
+    def run(candidates, budget):
+        jobs = [(name, c.config, c.trials, bandits, layout, seeds, c.episodes, budget, window) for c in candidates]
+        for c,(score, state) in zip(candidates, executor.map(advance, jobs)):
+            (c.score, c.trials, c.episodes) = (score, state, budget)
+    sample = lambda: sample_config(SPACES[name], rng)
+    try:
+        if use_hyperband:
+            return hyperband(sample, min_episodes, max_episodes, eta, run)
+        (survivors, history) = successive_halving([Candidate(sample()) for _ in range(configs)],
+                                                  min_episodes, max_episodes, eta, run)
+        return (survivors[0], history)
+    finally:
+        executor.shutdown()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Tunes agent arguments by successive halving.')
+    parser.add_argument('agent', choices = sorted(SPACES))
+    parser.add_argument('--configs', type = int, default = 27, help = 'Configurations sampled for successive halving')
+    parser.add_argument('--min-episodes', type = int, default = 100)
+    parser.add_argument('--max-episodes', type = int, default = 2700)
+    parser.add_argument('--eta', type = int, default = 3, help = 'Keep the best 1/eta of configurations at each rung')
+    parser.add_argument('--bandits', type = int, default = 10)
+    parser.add_argument('--trials', type = int, default = 5, help = 'Trial seeds each configuration is played on')
+    parser.add_argument('--window', type = int, default = 100, help = 'Final episodes averaged into a score')
+    parser.add_argument('--layout', help = 'ASCII layout spec file')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--workers', type = int, help = 'Worker processes (default: one per core)')
+    parser.add_argument('--hyperband', action = 'store_true', help = 'Run Hyperband brackets instead of one halving')
+    parser.add_argument('--out', help = 'Write every evaluation to this JSON file')
+    args = parser.parse_args(argv)
+    layout = None
+    if args.layout:
+        from layout import load_layout
+        layout = load_layout(args.layout)
+    (best, history) = search(args.agent, args.configs, args.min_episodes, args.max_episodes, args.eta,
+                             args.bandits, args.trials, args.window, layout, args.seed, args.workers,
+                             args.hyperband)
+    print 'Best: {0} ({1:.3f} over the last {2} of {3} episodes)'.format(
+        json.dumps(best.config, sort_keys = True), best.score, args.window, best.episodes)
+    if args.out:
+        f = open(args.out, 'w')
+        json.dump(history, f, indent = 2)
+        f.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Running statistics for aggregating many trials without holding them all in
+memory.
+"""
+import numpy as np
+
+def load_results(filename):
+    """
+    Loads a results CSV in bulk. Returns (headers, data), where data is a
+    (rows, columns) float array. Parsing is the cost of aggregating CSVs:
+    about 0.12 s per 100k-row trial, or two minutes for 1000 such trials.
+    Results cubes (see cube.py) skip it.
+    """
+    f = open(filename, 'rb')
+    headers = f.readline().strip().split(',')
+    text = f.read()
+    f.close()
+    return (headers, parse_rows(text, len(headers)))
+
+def parse_rows(text, columns):
+    """
+    Parses the body of a results CSV into a (rows, columns) float array.
+    """
+    text = text.strip()
+    if not text:
+        return np.zeros((0, columns))
+    data = np.fromstring(text.replace('\r\n', ',').replace('\n', ','), sep=',')
+    return data.reshape(-1, columns)
+
+class RunningStats(object):
+    """
+    Welford's online mean and variance over a stream of (rows, columns)
+    arrays, one per trial. Each row keeps its own count, so a trial that is
+    shorter than the rest only contributes to the rows it has, and rows are
+    added as longer trials arrive.
+    """
+    def __init__(self, rows, columns):
+        self.count = np.zeros(rows)
+        self.mean = np.zeros((rows, columns))
+        self.m2 = np.zeros((rows, columns))
+
+    def add(self, x, start = 0):
+        """
+        Adds rows start, start + 1, ... of one trial.
+        """
+        end = start + len(x)
+        if end > len(self.count):
+            self.resize(end)
+        rows = slice(start, end)
+        self.count[rows] += 1
+        delta = x - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows,None]
+        self.m2[rows] += delta * (x - self.mean[rows])
+
+    def resize(self, rows):
+        extra = rows - len(self.count)
+        self.count = np.concatenate((self.count, np.zeros(extra)))
+        self.mean = np.vstack((self.mean, np.zeros((extra, self.mean.shape[1]))))
+        self.m2 = np.vstack((self.m2, np.zeros((extra, self.m2.shape[1]))))
+
+    def variance(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.m2 / (self.count[:,None] - 1)
+
+    def stdev(self):
+        return np.sqrt(self.variance())
+
+    def stderr(self):
+        return self.stdev() / np.sqrt(self.count[:,None])
@@ -0,0 +1,379 @@
+"""
+Runs a full experiment sweep on the local machine.
+
+Every (bandit count, trial) pair is one job. Jobs are grouped into chunks, and
+each chunk runs in its own worker process, one per core at a time by default.
+A trial that raises is retried. A worker that dies without reporting back
+(killed for memory, a segfault, os._exit) is noticed by its exit code, and
+only its own chunk is retried. Results go into the same directory layout
+that make_jobs.py set up for Condor:
+
+    <K>_bandits/results/<K>_bandits_<trial>.csv
+    <K>_bandits/output/output_<trial>.out
+    <K>_bandits/error/error_<trial>.log
+
+With --cube, each bandit count instead gets one preallocated results cube,
+<K>_bandits/<K>_bandits.cube, and every trial writes its own slice of it.
+
+With --checkpoint-every, trials save checkpoints as they go. Retried trials
+pick up from their last checkpoint, and --resume does the same for every
+trial of an interrupted sweep.
+
+With --target-width, --trials becomes an upper bound. Trials run one at a
+time per worker, and each finished trial adds its mean score over the last
+--window episodes to its configuration's running statistics. A configuration
+stops launching trials once it has --min-trials and the 95% confidence
+interval of every series is narrower than the target. Free workers go to
+whichever configuration is still the most uncertain.
+"""
+import os
+import sys
+import argparse
+import Queue
+import traceback
+import multiprocessing
+from collections import namedtuple
+
+# Normal quantile for a 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+def make_directory(base, subdir):
+    if not base.endswith('/'):
+        base += '/'
+    directory = base + subdir
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    return directory
+
+Job = namedtuple('Job', ['experiment_dir', 'name', 'trial', 'bandits', 'episodes',
+                         'layout_file', 'seed', 'use_cube', 'checkpoint_every', 'instrument', 'regret'])
+
+def trial_seed(seed, trial):
+    """
+    Derives the seed of one trial from the sweep seed.
+    """
+    return (seed << 32) + trial
+
+def experiment_jobs(base, bandit_counts, trials, episodes, layout_file = None, seed = 0, use_cube = False,
+                    checkpoint_every = 0, resume = False, instrument = False, regret = False):
+    """
+    Creates the experiment directories, and the results cubes if asked, and
+    returns one job per trial. When resuming, existing cubes are kept.
+    """
+    jobs = []
+    for bandits in bandit_counts:
+        name = '{0}_bandits'.format(bandits)
+        experiment_dir = make_directory(base, name)
+        for subdir in ['output', 'error'] if use_cube else ['results', 'output', 'error']:
+            make_directory(experiment_dir, subdir)
+        if use_cube and not (resume and os.path.exists(cube_file(experiment_dir, name))):
+            import cube
+            import experiment
+            cube.create_cube(cube_file(experiment_dir, name), name.replace('_', ' '), trials, episodes,
+                             experiment.experiment_series(regret))
+        for trial in range(trials):
+            jobs.append(Job(experiment_dir, name, trial, bandits, episodes, layout_file,
+                            trial_seed(seed, trial), use_cube, checkpoint_every, instrument, regret))
+    return jobs
+
+def cube_file(experiment_dir, name):
+    return '{0}/{1}.cube'.format(experiment_dir, name)
+
+def trial_finished(job, outfile):
+    """
+    Returns whether a trial has already written all of its rows.
+    """
+    import experiment
+    if os.path.exists(experiment.checkpoint_file(outfile, job.trial if job.use_cube else None)):
+        return False
+    if job.use_cube:
+        import cube
+        data = cube.open_cube(outfile)[1]
+        return cube.completed_rows(data[job.trial]) == job.episodes
+    if not os.path.exists(outfile):
+        return False
+    f = open(outfile, 'rb')
+    rows = sum(1 for line in f) - 1
+    f.close()
+    return rows == job.episodes
+
+def trial_outfile(job):
+    """
+    Returns (outfile, slot): where a trial writes its results, and its slice
+    of the cube (None for CSV results).
+    """
+    if job.use_cube:
+        return (cube_file(job.experiment_dir, job.name), job.trial)
+    return ('{0}/results/{1}_{2}.csv'.format(job.experiment_dir, job.name, job.trial), None)
+
+def final_window_scores(job, window):
+    """
+    Returns the mean score of each series over the last window episodes of a
+    finished trial.
+    """
+    (outfile, slot) = trial_outfile(job)
+    if job.use_cube:
+        import cube
+        data = cube.open_cube(outfile)[1][slot]
+    else:
+        import stats
+        data = stats.load_results(outfile)[1][:,1:]
+    return data[-window:].mean(axis=0, dtype='float64')
+
+def run_trial(job, resume = False):
+    import experiment
+    from layout import load_layout, build_layout
+    layout = load_layout(job.layout_file) if job.layout_file else build_layout()
+    (outfile, slot) = trial_outfile(job)
+    if resume and trial_finished(job, outfile):
+        return
+    stdout = sys.stdout
+    sys.stdout = open('{0}/output/output_{1}.out'.format(job.experiment_dir, job.trial), 'a' if resume else 'w')
+    log = '{0}/output/log_{1}.jsonl'.format(job.experiment_dir, job.trial) if job.instrument else None
+    try:
+        print 'Seed: {0}'.format(job.seed)
+        experiment.run_experiment(outfile, job.bandits, job.episodes, layout, job.seed, slot,
+                                  job.checkpoint_every, resume, log, job.regret)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def run_chunk(jobs, resume = False):
+    """
+    Runs a chunk of jobs in a worker process. Returns the jobs that failed.
+    """
+    failed = []
+    for job in jobs:
+        try:
+            run_trial(job, resume)
+        except Exception:
+            f = open('{0}/error/error_{1}.log'.format(job.experiment_dir, job.trial), 'a')
+            f.write(traceback.format_exc())
+            f.close()
+            failed.append(job)
+    return failed
+
+def chunk_worker(key, jobs, resume, results):
+    results.put((key, run_chunk(jobs, resume)))
+
+class WorkerPool(object):
+    """
+    Runs chunks of jobs, each in a worker process of its own, and notices
+    workers that die. The concurrent.futures backport for Python 2 cannot:
+    a dead worker leaves its futures waiting forever.
+    """
+    def __init__(self, workers, poll = 0.5):
+        self.workers = workers
+        self.poll = poll
+        self.results = multiprocessing.Queue()
+        # Running workers by key: (process, tag)
+        self.running = {}
+        self.keys = 0
+
+    def full(self):
+        return len(self.running) >= self.workers
+
+    def submit(self, jobs, resume, tag):
+        process = multiprocessing.Process(target = chunk_worker, args = (self.keys, jobs, resume, self.results))
+        process.start()
+        self.running[self.keys] = (process, tag)
+        self.keys += 1
+
+    def wait(self):
+        """
+        Blocks until at least one chunk is done. Returns a (tag, failed) pair
+        for each, where failed holds the jobs that raised, or is None if the
+        worker died.
+        """
+        done = []
+        while not done:
+            try:
+                (key, failed) = self.results.get(timeout = self.poll)
+            except Queue.Empty:
+                # A worker that reports back exits cleanly, so an error exit
+                # means it died first
+                for key,(process, tag) in self.running.items():
+                    if not process.is_alive() and process.exitcode != 0:
+                        process.join()
+                        del self.running[key]
+                        done.append((tag, None))
+                continue
+            worker = self.running.pop(key, None)
+            if worker is None:
+                # It was killed after reporting back, and already counted
+                # as died
+                continue
+            (process, tag) = worker
+            process.join()
+            done.append((tag, failed))
+        return done
+
+def run_sweep(jobs, workers = None, chunksize = None, retries = 2, resume = False):
+    """
+    Runs every job in worker processes, retrying failed jobs up to retries
+    times. Retries resume from the job's last checkpoint. Returns the jobs
+    that never succeeded.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(jobs) // (workers * 4))
+    attempts = dict((job, 0) for job in jobs)
+    abandoned = []
+    chunks = [jobs[i:i+chunksize] for i in range(0, len(jobs), chunksize)]
+    (finished, total) = (0, len(chunks))
+    pool = WorkerPool(workers)
+    while chunks or pool.running:
+        while chunks and not pool.full():
+            chunk = chunks.pop(0)
+            pool.submit(chunk, resume or any(attempts[job] for job in chunk), chunk)
+        for (chunk, failed) in pool.wait():
+            if failed is None:
+                # The worker died, so we don't know which of its jobs finished
+                failed = chunk
+            retry = []
+            for job in failed:
+                attempts[job] += 1
+                if attempts[job] <= retries:
+                    retry.append(job)
+                else:
+                    abandoned.append(job)
+            if retry:
+                chunks.append(retry)
+                total += 1
+            finished += 1
+            print 'Finished {0} of {1} chunks'.format(finished, total)
+    return abandoned
+
+class Allocation(object):
+    """
+    The trials of one configuration, and the running statistics of the
+    final-window scores of the ones that have finished.
+    """
+    def __init__(self, jobs):
+        self.waiting = sorted(jobs, key = lambda job: job.trial, reverse = True)
+        self.running = 0
+        self.stats = None
+
+    def finished(self):
+        return 0 if self.stats is None else int(self.stats.count[0])
+
+    def add(self, scores):
+        if self.stats is None:
+            import stats
+            self.stats = stats.RunningStats(1, len(scores))
+        self.stats.add(scores[None])
+
+    def width(self, trials = None):
+        """
+        Returns the widest 95% confidence interval of any series, as it
+        stands or as it would be with the given number of trials.
+        """
+        if self.finished() < 2:
+            return float('inf')
+        if trials is None:
+            trials = self.finished()
+        return 2 * CONFIDENCE_Z * self.stats.stdev()[0].max() / trials ** 0.5
+
+    def needs_trials(self, target_width, min_trials):
+        """
+        Returns how uncertain the configuration is expected to be once its
+        running trials finish, or None if it should not get another trial.
+        """
+        if not self.waiting:
+            return None
+        trials = self.finished() + self.running
+        if trials < min_trials:
+            return float('inf')
+        width = self.width(trials)
+        return width if width > target_width else None
+
+def run_adaptive(jobs, target_width, min_trials = 10, window = 100, workers = None, retries = 2, resume = False):
+    """
+    Runs trials of each configuration until every series' final-window score
+    has a 95% confidence interval narrower than target_width, or until the
+    configuration runs out of trials. Returns (abandoned, allocations), where
+    allocations maps each configuration name to its Allocation.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    allocations = {}
+    for job in jobs:
+        allocations.setdefault(job.name, []).append(job)
+    allocations = dict((name, Allocation(trials)) for name,trials in allocations.items())
+    attempts = dict((job, 0) for job in jobs)
+    abandoned = []
+    pool = WorkerPool(workers)
+    while True:
+        while not pool.full():
+            # The most uncertain configuration goes first, and ties go to the
+            # one with the fewest trials
+            candidates = [(allocation.needs_trials(target_width, min_trials),
+                           -(allocation.finished() + allocation.running), name)
+                          for name,allocation in allocations.items()]
+            candidates = [c for c in candidates if c[0] is not None]
+            if not candidates:
+                break
+            allocation = allocations[max(candidates)[2]]
+            job = allocation.waiting.pop()
+            allocation.running += 1
+            pool.submit([job], resume or attempts[job] > 0, job)
+        if not pool.running:
+            break
+        for (job, failed) in pool.wait():
+            allocation = allocations[job.name]
+            allocation.running -= 1
+            # A worker that died (failed is None) fails only its own job
+            if failed is None or failed:
+                attempts[job] += 1
+                if attempts[job] <= retries:
+                    allocation.waiting.append(job)
+                else:
+                    abandoned.append(job)
+                continue
+            allocation.add(final_window_scores(job, window))
+            print '{0}: {1} trials, CI width {2:.3f}'.format(job.name, allocation.finished(), allocation.width())
+    return (abandoned, allocations)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Runs a TSTD(0) vs. Q-Learning sweep on all local cores.')
+    parser.add_argument('--bandits', type = int, nargs = '+', default = [2, 3, 5, 10, 20, 50, 100])
+    parser.add_argument('--trials', type = int, default = 100)
+    parser.add_argument('--episodes', type = int, default = 10000)
+    parser.add_argument('--layout', help = 'ASCII layout spec file')
+    parser.add_argument('--workers', type = int, help = 'Worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type = int, help = 'Trials per scheduled chunk')
+    parser.add_argument('--retries', type = int, default = 2)
+    parser.add_argument('--seed', type = int, default = 0, help = 'Sweep seed; trial seeds are derived from it')
+    parser.add_argument('--dir', default = os.getcwd(), help = 'Base directory for results')
+    parser.add_argument('--cube', action = 'store_true', help = 'Write each experiment to one memory-mapped results cube')
+    parser.add_argument('--checkpoint-every', type = int, default = 0, help = 'Episodes between trial checkpoints (default: never)')
+    parser.add_argument('--resume', action = 'store_true', help = 'Resume an interrupted sweep from its checkpoints')
+    parser.add_argument('--instrument', action = 'store_true', help = 'Write per-episode JSON lines logs to each output directory')
+    parser.add_argument('--regret', action = 'store_true', help = 'Add per-episode regret columns to the results')
+    parser.add_argument('--target-width', type = float,
+                        help = 'Stop each configuration once the 95%% CI of its final-window scores is this narrow')
+    parser.add_argument('--min-trials', type = int, default = 10, help = 'Trials per configuration before it can stop early')
+    parser.add_argument('--window', type = int, default = 100, help = 'Final episodes averaged into each trial\'s score')
+    args = parser.parse_args(argv)
+    if args.layout:
+        # Compile the layout once up front rather than racing in every worker
+        from layout import load_layout
+        load_layout(args.layout)
+    jobs = experiment_jobs(args.dir, args.bandits, args.trials, args.episodes, args.layout, args.seed, args.cube,
+                           args.checkpoint_every, args.resume, args.instrument, args.regret)
+    if args.target_width:
+        (abandoned, allocations) = run_adaptive(jobs, args.target_width, args.min_trials, args.window, args.workers,
+                                                args.retries, args.resume)
+        for bandits in args.bandits:
+            allocation = allocations['{0}_bandits'.format(bandits)]
+            print '{0} bandits: {1} trials, CI width {2:.3f}'.format(bandits, allocation.finished(), allocation.width())
+    else:
+        abandoned = run_sweep(jobs, args.workers, args.chunksize, args.retries, args.resume)
+    for job in abandoned:
+        print 'Gave up on {0} trial {1}'.format(job.name, job.trial)
+    if abandoned:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
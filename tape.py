@@ -0,0 +1,100 @@
+"""
+Action tapes: the outcome of every pull of every bandit in a world.
+
+A tape holds each bandit's partitions and the actions its pulls returned, in
+order. A world built from a tape replays it, so the i-th pull of bandit b
+returns the same action for every agent played against the tape, and a new
+agent can be evaluated against a saved tape without the seed that made it.
+
+Tapes taken from a seeded world keep the seed. When an agent pulls a bandit
+more often than the tape covers, the rest of that bandit's actions come from
+its seeded stream, exactly as in the original world. A tape without a seed
+raises once a bandit runs out.
+"""
+import numpy as np
+from gridworld import ACTION_STREAM, BLOCK_SIZE, make_rng, sample_actions
+
+class ActionTape(object):
+    def __init__(self, first, second, actions, seed = None):
+        self.first = np.asarray(first, dtype=np.float64)
+        self.second = np.asarray(second, dtype=np.float64)
+        self.actions = [np.asarray(a, dtype=np.uint8) for a in actions]
+        self.seed = seed
+        self.num_bandits = len(self.first)
+
+    @staticmethod
+    def from_worlds(worlds):
+        """
+        Records the tape of identically seeded worlds, covering as many pulls
+        of each bandit as any of the worlds made.
+        """
+        seed = worlds[0].seed
+        if seed is None:
+            raise ValueError('Only seeded worlds can be recorded to a tape')
+        bandits = worlds[0].bandits
+        first = [b.first for b in bandits]
+        second = [b.second for b in bandits]
+        # Seeded bandits are deterministic, so their outcomes are regenerated
+        # rather than kept as they are played
+        actions = [sample_actions(make_rng(seed, ACTION_STREAM, b), first[b], second[b],
+                                  max(world.bandits[b].pulls() for world in worlds))
+                   for b in range(len(bandits))]
+        return ActionTape(first, second, actions, seed)
+
+    def bandits(self):
+        return [TapeBandit(self, b) for b in range(self.num_bandits)]
+
+    def save(self, filename):
+        lengths = [len(a) for a in self.actions]
+        # Through a file object, so np.savez doesn't add an .npz suffix
+        f = open(filename, 'wb')
+        np.savez_compressed(f, first=self.first, second=self.second, lengths=lengths,
+                            actions=np.concatenate(self.actions) if lengths else np.zeros(0, np.uint8),
+                            seed=np.array('' if self.seed is None else str(self.seed)))
+        f.close()
+
+    @staticmethod
+    def load(filename):
+        f = np.load(filename)
+        seed = str(f['seed'])
+        ends = np.cumsum(f['lengths'])
+        actions = np.split(f['actions'], ends[:-1]) if len(ends) else []
+        tape = ActionTape(f['first'], f['second'], actions, int(seed) if seed else None)
+        f.close()
+        return tape
+
+class TapeBandit(object):
+    """
+    A bandit that replays one bandit's outcomes from a tape.
+    """
+    def __init__(self, tape, b, block_size = BLOCK_SIZE):
+        self.tape = tape
+        self.index = b
+        self.first = tape.first[b]
+        self.second = tape.second[b]
+        self.block_size = block_size
+        self.block = tape.actions[b].tolist()
+        self.pos = 0
+        # Pulls made before the current block
+        self.offset = 0
+        self.rng = None
+
+    def sample(self):
+        if self.pos == len(self.block):
+            self.next_block()
+        self.pos += 1
+        return self.block[self.pos - 1]
+
+    def next_block(self):
+        if self.tape.seed is None:
+            raise IndexError('The tape of bandit {0} ran out after {1} pulls'.format(self.index, self.pulls()))
+        if self.rng is None:
+            # Pick the bandit's stream up where the tape left off
+            self.rng = make_rng(self.tape.seed, ACTION_STREAM, self.index)
+            self.rng.random_sample(len(self.tape.actions[self.index]))
+        self.offset += len(self.block)
+        self.block = sample_actions(self.rng, self.first, self.second, self.block_size).tolist()
+        self.pos = 0
+
+    def pulls(self):
+        return self.offset + self.pos
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import plot_results
+from stats import RunningStats
+
+HEADERS = ['Episodes', 'TSTD(0)', 'Q-Learning']
+
+def write_trial(directory, trial, data, mode = 'wb', name = '2_bandits'):
+    f = open(os.path.join(directory, '{0}_{1}.csv'.format(name, trial)), mode)
+    if mode == 'wb':
+        f.write(','.join(HEADERS) + '\n')
+    for row in data:
+        f.write('{0},{1!r},{2!r}\n'.format(int(row[0]), row[1], row[2]))
+    f.close()
+
+def random_trial(rng, episodes, start = 0):
+    return np.column_stack((np.arange(start + 1, start + episodes + 1), rng.randn(episodes, 2)))
+
+def expected(trials):
+    """
+    The mean and sample stdev of every row over the trials that have it.
+    """
+    rows = max(len(t) for t in trials)
+    (mean, stdev) = (np.zeros((rows, 3)), np.zeros((rows, 3)))
+    for r in range(rows):
+        values = np.array([t[r] for t in trials if len(t) > r])
+        mean[r] = values.mean(axis=0)
+        stdev[r] = values.std(axis=0, ddof=1) if len(values) > 1 else np.nan
+    return (mean, stdev)
+
+def check(stats, trials):
+    (mean, stdev) = expected(trials)
+    assert np.allclose(stats.mean, mean)
+    assert np.allclose(stats.stdev(), stdev, equal_nan=True)
+
+def test_running_stats_match_numpy():
+    rng = np.random.RandomState(0)
+    trials = [random_trial(rng, n) for n in [5, 8, 3, 8]]
+    stats = RunningStats(0, 3)
+    for t in trials:
+        stats.add(t)
+    check(stats, trials)
+
+def test_csv_aggregation_matches_numpy(tmpdir):
+    rng = np.random.RandomState(1)
+    trials = [random_trial(rng, n) for n in [20, 20, 12]]
+    for i,t in enumerate(trials):
+        write_trial(str(tmpdir), i, t)
+    (name, headers, stats, count) = plot_results.aggregate_csv_results(str(tmpdir))
+    assert (name, headers, count) == ('2 bandits', HEADERS, 3)
+    check(stats, trials)
+
+def test_sidecar_reads_only_new_rows(tmpdir, monkeypatch):
+    rng = np.random.RandomState(2)
+    trials = [random_trial(rng, 10), random_trial(rng, 6)]
+    for i,t in enumerate(trials):
+        write_trial(str(tmpdir), i, t)
+    plot_results.aggregate_csv_results(str(tmpdir))
+    # A running trial grows, and a new one starts
+    more = random_trial(rng, 4, start = 6)
+    write_trial(str(tmpdir), 1, more, 'ab')
+    trials[1] = np.vstack((trials[1], more))
+    trials.append(random_trial(rng, 7))
+    write_trial(str(tmpdir), 2, trials[2])
+    parsed = []
+    parse_rows = plot_results.parse_rows
+    def counting(text, columns):
+        data = parse_rows(text, columns)
+        parsed.append(len(data))
+        return data
+    monkeypatch.setattr(plot_results, 'parse_rows', counting)
+    (name, headers, stats, count) = plot_results.aggregate_csv_results(str(tmpdir))
+    assert count == 3
+    assert sorted(parsed) == [4, 7]
+    check(stats, trials)
+
+def test_rewritten_trial_rebuilds_the_aggregate(tmpdir):
+    rng = np.random.RandomState(3)
+    trials = [random_trial(rng, 10), random_trial(rng, 10)]
+    for i,t in enumerate(trials):
+        write_trial(str(tmpdir), i, t)
+    plot_results.aggregate_csv_results(str(tmpdir))
+    trials[0] = random_trial(rng, 10)
+    write_trial(str(tmpdir), 0, trials[0])
+    check(plot_results.aggregate_csv_results(str(tmpdir))[2], trials)
+    os.remove(os.path.join(str(tmpdir), '2_bandits_1.csv'))
+    check(plot_results.aggregate_csv_results(str(tmpdir))[2], trials[:1])
+
+def test_trials_without_rows_are_not_counted(tmpdir):
+    rng = np.random.RandomState(4)
+    write_trial(str(tmpdir), 0, random_trial(rng, 5))
+    write_trial(str(tmpdir), 1, [])
+    open(os.path.join(str(tmpdir), '2_bandits_2.csv'), 'wb').close()
+    assert plot_results.aggregate_csv_results(str(tmpdir))[3] == 1
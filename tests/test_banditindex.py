@@ -0,0 +1,60 @@
+import numpy as np
+from banditindex import GreedyIndex, ThompsonIndex
+from gridworld import GridWorld, make_rng, AGENT_STREAM
+from layout import build_layout
+import tstd
+
+def tied(index, state):
+    """
+    Returns how many bandits the index would pick between in state.
+    """
+    fresh = index.count[state] if index.initial >= index.top[state] else 0
+    ties = index.ties[state] if index.top[state] >= index.initial or fresh == 0 else []
+    return fresh + len(ties)
+
+def test_greedy_index_matches_scan():
+    rng = np.random.RandomState(0)
+    for trial in range(50):
+        (states, bandits) = (3, rng.randint(1, 30))
+        q = np.zeros((states, bandits))
+        index = GreedyIndex(states, bandits)
+        for step in range(200):
+            (s, k) = (rng.randint(states), rng.randint(bandits))
+            # Ties with the top value and drops of the top bandit are the hard cases
+            q[s,k] = rng.choice([-1., 0., 0.5, 1., q[s].max(), q[s,k] - 0.25])
+            index.update(q[s], s, k)
+            for t in range(states):
+                best = set(np.flatnonzero(q[t] == q[t].max()))
+                assert tied(index, t) == len(best)
+                picks = set(index.greedy(q[t], t, rng)[0] for _ in range(3 * bandits))
+                assert picks <= best
+
+def test_thompson_index_matches_scan():
+    rng = np.random.RandomState(1)
+    for trial in range(60):
+        bandits = rng.choice([1, 2, 5, 50, 2000])
+        priors = 1 + rng.poisson(3, (bandits, 3))
+        samples = rng.gamma(priors)
+        samples /= samples.sum(axis=1, keepdims=True)
+        index = ThompsonIndex(bandits)
+        index.rebuild(samples)
+        for step in range(20):
+            if rng.rand() < 0.7:
+                # Redrawn in place, as the 'changed' resampling policy does
+                k = rng.randint(bandits)
+                row = rng.gamma(priors[k])
+                samples[k] = row / row.sum()
+                index.changed(k)
+            q = rng.choice([0., 1., 4., 10.], 3) + rng.choice([0, 1e-3], 3) * rng.rand(3)
+            gap = q.max() - q
+            assert index.best(gap) == samples.dot(gap).argmin()
+
+def test_indexed_tstd_plays_like_scan():
+    layout = build_layout()
+    scores = []
+    for index in [False, True]:
+        agent = tstd.TSTDAgent(200, layout = layout, rng = make_rng(1, AGENT_STREAM, 0), resample = 'changed',
+                               resample_every = 50, index = index)
+        world = GridWorld(num_bandits = 200, agent = agent, layout = layout, seed = 1)
+        scores.append([world.play_episode() for ep in range(40)])
+    assert scores[0] == scores[1]
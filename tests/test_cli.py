@@ -0,0 +1,14 @@
+import numpy as np
+import cli
+from test_aggregate import write_trial, random_trial
+
+def test_plot_summary_over_some_bandit_counts(tmpdir, monkeypatch):
+    rng = np.random.RandomState(0)
+    for bandits in [2, 5]:
+        results = tmpdir.mkdir('{0}_bandits'.format(bandits)).mkdir('results')
+        for trial in range(2):
+            write_trial(str(results), trial, random_trial(rng, 20), name = '{0}_bandits'.format(bandits))
+    monkeypatch.chdir(tmpdir)
+    cli.main(['plot', 'Sizes', '2_bandits/results/', '5_bandits/results/', '--summary', '--workers', '1'])
+    for filename in ['2_bandits.png', '5_bandits.png', 'summary.png']:
+        assert tmpdir.join(filename).check()
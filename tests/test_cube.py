@@ -0,0 +1,36 @@
+import numpy as np
+import cube
+import experiment
+import plot_results
+import resultsdb
+from stats import load_results
+
+def test_cube_trials_match_csv_trials(tmpdir):
+    filename = str(tmpdir.join('2_bandits' + cube.CUBE_SUFFIX))
+    cube.create_cube(filename, '2 bandits', 3, 8, experiment.experiment_series())
+    for trial in range(2):
+        experiment.run_experiment(filename, 2, 8, seed = trial, trial = trial)
+        experiment.run_experiment(str(tmpdir.join('2_bandits_{0}.csv'.format(trial))), 2, 8, seed = trial)
+    (header, data) = cube.open_cube(filename)
+    assert header['series'] == experiment.experiment_series()
+    # The third trial never ran
+    assert [cube.completed_rows(trial) for trial in data] == [8, 8, 0]
+    for trial in range(2):
+        rows = load_results(str(tmpdir.join('2_bandits_{0}.csv'.format(trial))))[1]
+        assert np.allclose(data[trial], rows[:,1:])
+    (name, headers, stats, trials) = plot_results.aggregate_cube_results(filename)
+    (csv_name, csv_headers, csv_stats, csv_trials) = plot_results.aggregate_csv_results(str(tmpdir))
+    assert (name, headers, trials) == (csv_name, csv_headers, csv_trials)
+    assert np.allclose(stats.mean, csv_stats.mean)
+    db = resultsdb.connect(':memory:')
+    assert resultsdb.ingest(db, filename) == ('2 bandits', 2)
+    assert np.allclose(resultsdb.episode_stats(db, '2 bandits')[1], csv_stats.mean)
+
+def test_partly_written_trial(tmpdir):
+    filename = str(tmpdir.join('x.cube'))
+    cube.create_cube(filename, 'x', 1, 4, ['Episodes', 'A'])
+    writer = cube.CubeWriter(filename, 0)
+    writer.writerow([1, 5.])
+    writer.writerow([2, 6.])
+    writer.close()
+    assert cube.completed_rows(cube.open_cube(filename)[1][0]) == 2
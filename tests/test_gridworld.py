@@ -0,0 +1,15 @@
+import cPickle as pickle
+import numpy as np
+from gridworld import GridWorld, ACTION_STREAM, BLOCK_SIZE, make_rng, sample_actions
+
+def test_bandit_streams_are_made_on_first_pull():
+    world = GridWorld(num_bandits = 50, seed = 5)
+    bandit = world.bandits[7]
+    assert all(b.rng is None for b in world.bandits)
+    pulls = [bandit.sample() for i in range(BLOCK_SIZE + 10)]
+    expected = sample_actions(make_rng(5, ACTION_STREAM, 7), bandit.first, bandit.second, 3 * BLOCK_SIZE)
+    assert pulls == expected[:len(pulls)].tolist()
+    assert [b.rng is None for b in world.bandits].count(False) == 1
+    # A pickled world carries on from where it was
+    copy = pickle.loads(pickle.dumps(world, 2))
+    assert [copy.bandits[7].sample() for i in range(BLOCK_SIZE)] == expected[len(pulls):len(pulls) + BLOCK_SIZE].tolist()
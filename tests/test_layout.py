@@ -0,0 +1,58 @@
+import os
+import shutil
+import pytest
+import numpy as np
+from layout import build_layout, load_layout, parse_layout, UP, RIGHT, DOWN
+
+def original_rewards(width, height):
+    """
+    The transitions of the original REWARDS dict, keyed by ((x, y), action).
+    """
+    goal = (width - 1, int(height / 2))
+    rewards = {}
+    for x in range(width):
+        for y in range(height):
+            rewards[((x, y), UP)] = (((x, y), -4) if y == 0 else
+                                     (goal, 10) if (x, y - 1) == goal else ((x, y - 1), 0))
+            if x == width - 1:
+                rewards[((x, y), RIGHT)] = ((x, y), -4)
+            elif (x + 1, y) == goal:
+                rewards[((x, y), RIGHT)] = (goal, 9)
+            elif x == width - 2:
+                rewards[((x, y), RIGHT)] = ((x + 1, y), -1 if y == 0 else 3)
+            else:
+                rewards[((x, y), RIGHT)] = ((x + 1, y), 0)
+            rewards[((x, y), DOWN)] = (((x, y), -4) if y == height - 1 else
+                                       (goal, 10) if (x, y + 1) == goal else ((x, y + 1), 0))
+    return rewards
+
+@pytest.mark.parametrize('size', [(4, 3), (7, 5), (10, 10)])
+def test_build_layout_matches_original_rewards(size):
+    (width, height) = size
+    layout = build_layout(width, height)
+    for ((x, y), action),((nx, ny), reward) in original_rewards(width, height).items():
+        s = y * width + x
+        assert layout.next_state[s, action] == ny * width + nx
+        assert layout.reward[s, action] == reward
+    assert (layout.start, layout.goal) == (int(height / 2) * width, int(height / 2) * width + width - 1)
+
+def test_spec_file_matches_built_layout(tmpdir):
+    spec = str(tmpdir.join('mab.txt'))
+    shutil.copy(os.path.join(os.path.dirname(__file__), os.pardir, 'layouts', 'mab.txt'), spec)
+    built = build_layout()
+    # The first load parses and caches, the second reads the cache
+    for layout in [load_layout(spec), load_layout(spec)]:
+        assert (layout.start, layout.goal) == (built.start, built.goal)
+        assert np.array_equal(layout.next_state, built.next_state)
+        assert np.array_equal(layout.reward, built.reward)
+    assert os.path.exists(spec + '.npz')
+
+def test_blocked_cells_and_bad_specs():
+    layout = parse_layout('S.X\n..G\n')
+    assert layout.next_state[1, RIGHT] == 1
+    assert layout.reward[1, RIGHT] == -4
+    assert layout.reward[4, RIGHT] == 10
+    with pytest.raises(ValueError):
+        parse_layout('S..\n...\n')
+    with pytest.raises(ValueError):
+        parse_layout('S..G\n..\n')
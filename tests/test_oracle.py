@@ -0,0 +1,91 @@
+import itertools
+import numpy as np
+import oracle
+import experiment
+from gridworld import GridWorld
+from layout import build_layout
+from stats import load_results
+
+def random_moves(rng, layout):
+    return rng.dirichlet(np.ones(3), layout.num_states)
+
+def brute_force(layout, moves, horizon):
+    """
+    Sums the reward of every action sequence of horizon moves from every
+    state, weighted by its probability. A sequence that reaches the goal
+    early is only counted once, with UP for every move after the goal.
+    """
+    values = np.zeros(layout.num_states)
+    for start in range(layout.num_states):
+        for actions in itertools.product(range(3), repeat = horizon):
+            (state, p, total) = (start, 1., 0.)
+            for a in actions:
+                if state == layout.goal:
+                    p *= a == 0
+                    continue
+                p *= moves[state, a]
+                total += layout.reward[state, a]
+                state = layout.next_state[state, a]
+            values[start] += p * total
+    return values
+
+def test_evaluate_policy_matches_brute_force():
+    rng = np.random.RandomState(0)
+    # The 4x3 grid takes the dense path, and 10x10 the iterative one
+    for (width, height) in [(4, 3), (10, 10)]:
+        layout = build_layout(width, height)
+        moves = random_moves(rng, layout)
+        for horizon in [1, 2, 5]:
+            expected = brute_force(layout, moves, horizon)
+            assert np.allclose(oracle.evaluate_policy(layout, moves, horizon), expected)
+
+def test_evaluate_policy_batches_worlds():
+    rng = np.random.RandomState(1)
+    layout = build_layout()
+    moves = np.array([random_moves(rng, layout) for w in range(3)])
+    values = oracle.evaluate_policy(layout, moves, 7)
+    for w in range(3):
+        assert np.allclose(values[w], oracle.evaluate_policy(layout, moves[w], 7))
+
+def test_linear_solve_is_the_long_horizon_limit():
+    rng = np.random.RandomState(2)
+    layout = build_layout()
+    moves = random_moves(rng, layout)
+    assert np.allclose(oracle.evaluate_policy(layout, moves, None),
+                       oracle.evaluate_policy(layout, moves, 2**20))
+
+def expectimax(layout, probs, horizon):
+    """
+    The optimal value of every state over every bandit, one state and
+    bandit at a time.
+    """
+    values = [0.] * layout.num_states
+    for h in range(horizon):
+        values = [0. if s == layout.goal else
+                  max(sum(p[a] * (layout.reward[s, a] + values[layout.next_state[s, a]]) for a in range(3))
+                      for p in probs)
+                  for s in range(layout.num_states)]
+    return np.array(values)
+
+def test_value_iteration_matches_expectimax():
+    rng = np.random.RandomState(3)
+    for (width, height) in [(4, 3), (5, 5)]:
+        layout = build_layout(width, height)
+        probs = rng.dirichlet(np.ones(3), 40)
+        (values, choices) = oracle.value_iteration(layout, probs, 6, policy = True)
+        assert np.allclose(values, expectimax(layout, probs, 6))
+        # Following the chosen bandits earns the optimal values
+        v = np.zeros(layout.num_states)
+        for h in range(6):
+            moves = probs[choices[h]]
+            v = (moves * (layout.reward + v[layout.next_state])).sum(axis=1)
+            v[layout.goal] = 0
+        assert np.allclose(v, values)
+
+def test_regret_columns(tmpdir):
+    outfile = str(tmpdir.join('regret.csv'))
+    experiment.run_experiment(outfile, 5, 6, seed = 2, regret = True)
+    (headers, data) = load_results(outfile)
+    assert headers == experiment.experiment_series(regret = True)
+    optimal = oracle.optimal_value(GridWorld(num_bandits = 5, seed = 2))
+    assert np.allclose(data[:,3:5], optimal - data[:,1:3])
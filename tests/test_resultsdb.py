@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import resultsdb
+import plot_results
+from stats import RunningStats
+from test_aggregate import HEADERS, write_trial, random_trial
+
+def assert_same(a, b):
+    assert np.allclose(a, b, equal_nan=True)
+
+def test_store_matches_csv_aggregation(tmpdir, monkeypatch):
+    # Small blocks, so trials end in different blocks
+    monkeypatch.setattr(resultsdb, 'EPISODE_BLOCK', 4)
+    rng = np.random.RandomState(0)
+    for i,n in enumerate([10, 10, 7, 3]):
+        write_trial(str(tmpdir), i, random_trial(rng, n))
+    # Trials that are still starting up
+    write_trial(str(tmpdir), 4, [])
+    open(os.path.join(str(tmpdir), '2_bandits_5.csv'), 'wb').close()
+    db = resultsdb.connect(':memory:')
+    assert resultsdb.ingest(db, str(tmpdir)) == ('2 bandits', 4)
+    (headers, mean, stdev, stderr, trials) = resultsdb.episode_stats(db, '2 bandits')
+    (name, csv_headers, stats, csv_trials) = plot_results.aggregate_csv_results(str(tmpdir))
+    assert (headers, trials) == (csv_headers, csv_trials)
+    assert_same(mean, stats.mean)
+    assert_same(stdev, stats.stdev())
+    assert_same(stderr, stats.stderr())
+
+def test_trial_counts_up_to_its_first_gap(monkeypatch):
+    monkeypatch.setattr(resultsdb, 'EPISODE_BLOCK', 4)
+    rng = np.random.RandomState(1)
+    data = rng.randn(2, 10, 2)
+    # Episode 3 of the second trial is missing, but later ones are there
+    data[1,2,0] = np.nan
+    db = resultsdb.connect(':memory:')
+    experiment = resultsdb.experiment_id(db, '2 bandits')
+    resultsdb.insert_scores(db, experiment, resultsdb.series_ids(db, experiment, HEADERS[1:]), [0, 1], data)
+    (headers, mean, stdev, stderr, trials) = resultsdb.episode_stats(db, '2 bandits')
+    stats = RunningStats(10, 3)
+    episodes = np.arange(1, 11)[:,None]
+    stats.add(np.hstack((episodes, data[0])))
+    stats.add(np.hstack((episodes, data[1]))[:2])
+    assert trials == 2
+    assert_same(mean, stats.mean)
+    assert_same(stdev, stats.stdev())
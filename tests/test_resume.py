@@ -0,0 +1,42 @@
+import os
+import pytest
+import experiment
+from gridworld import GridWorld
+
+class Interrupted(Exception):
+    pass
+
+def read(filename):
+    f = open(filename, 'rb')
+    data = f.read()
+    f.close()
+    return data
+
+@pytest.mark.parametrize('options', [{}, {'eval_tstd': True, 'eval_interval': 3, 'regret': True,
+                                           'resample': 'changed', 'index': True}])
+def test_resumed_run_matches_uninterrupted(tmpdir, monkeypatch, options):
+    (episodes, every) = (30, 10)
+    whole = str(tmpdir.join('whole.csv'))
+    experiment.run_experiment(whole, 20, episodes, seed = 7, **options)
+
+    # Crash partway between the second and third checkpoints, leaving rows
+    # past the last checkpoint in the file
+    resumed = str(tmpdir.join('resumed.csv'))
+    play_episode = GridWorld.play_episode
+    played = [0]
+    def crash(world):
+        played[0] += 1
+        if played[0] > 2 * 25:
+            raise Interrupted()
+        return play_episode(world)
+    monkeypatch.setattr(GridWorld, 'play_episode', crash)
+    with pytest.raises(Interrupted):
+        experiment.run_experiment(resumed, 20, episodes, seed = 7, checkpoint_every = every, **options)
+    monkeypatch.setattr(GridWorld, 'play_episode', play_episode)
+    assert os.path.exists(experiment.checkpoint_file(resumed))
+    assert read(resumed) != read(whole)
+
+    experiment.run_experiment(resumed, 20, episodes, seed = 7, checkpoint_every = every, resume = True,
+                              **options)
+    assert read(resumed) == read(whole)
+    assert not os.path.exists(experiment.checkpoint_file(resumed))
@@ -0,0 +1,30 @@
+import re
+import numpy as np
+import experiment
+from gridworld import GridWorld, make_rng, WORLD_STREAM, ACTION_STREAM, AGENT_STREAM
+
+def draws(rng):
+    return rng.random_sample(5).tolist()
+
+def test_streams_are_keyed_by_seed_stream_and_keys():
+    assert draws(make_rng(1, ACTION_STREAM, 3)) == draws(make_rng(1, ACTION_STREAM, 3))
+    others = [make_rng(2, ACTION_STREAM, 3), make_rng(1, AGENT_STREAM, 3), make_rng(1, ACTION_STREAM, 4),
+              make_rng(1, WORLD_STREAM), make_rng(1 << 32, ACTION_STREAM, 3)]
+    assert len(set(tuple(draws(rng)) for rng in others + [make_rng(1, ACTION_STREAM, 3)])) == len(others) + 1
+
+def test_identically_seeded_worlds_share_outcomes():
+    worlds = [GridWorld(num_bandits = 5, seed = 9) for i in range(2)]
+    assert [(b.first, b.second) for b in worlds[0].bandits] == [(b.first, b.second) for b in worlds[1].bandits]
+    # The n-th pull of a bandit is the same whatever was pulled before it
+    first = [worlds[0].bandits[2].sample() for i in range(50)]
+    for b in [0, 1, 3]:
+        [worlds[1].bandits[b].sample() for i in range(20)]
+    assert [worlds[1].bandits[2].sample() for i in range(50)] == first
+
+def test_unseeded_run_prints_a_seed_that_reproduces_it(tmpdir, capsys):
+    first = str(tmpdir.join('first.csv'))
+    experiment.run_experiment(first, 5, 5)
+    seed = int(re.search(r'Seed: (\d+)', capsys.readouterr()[0]).group(1))
+    again = str(tmpdir.join('again.csv'))
+    experiment.run_experiment(again, 5, 5, seed = seed)
+    assert tmpdir.join('first.csv').read() == tmpdir.join('again.csv').read()
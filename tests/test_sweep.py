@@ -0,0 +1,49 @@
+import os
+import sweep
+
+def finished(jobs):
+    return [sweep.trial_finished(job, sweep.trial_outfile(job)[0]) for job in jobs]
+
+def kill_first_attempt(monkeypatch, trials):
+    """
+    Makes the worker running any of the given trials die without reporting
+    back, unless it is a retry.
+    """
+    run_trial = sweep.run_trial
+    def dying(job, resume = False):
+        if job.trial in trials and not resume:
+            os._exit(1)
+        run_trial(job, resume)
+    monkeypatch.setattr(sweep, 'run_trial', dying)
+
+def test_dead_worker_chunk_is_retried(tmpdir, monkeypatch):
+    jobs = sweep.experiment_jobs(str(tmpdir), [2], 4, 5, seed = 3)
+    kill_first_attempt(monkeypatch, [1])
+    assert sweep.run_sweep(jobs, workers = 2, chunksize = 2) == []
+    assert all(finished(jobs))
+
+def test_dead_worker_runs_out_of_retries(tmpdir, monkeypatch):
+    jobs = sweep.experiment_jobs(str(tmpdir), [2], 2, 5, seed = 3)
+    monkeypatch.setattr(sweep, 'run_trial', lambda job, resume = False: os._exit(1))
+    assert sorted(sweep.run_sweep(jobs, workers = 2, chunksize = 1, retries = 1)) == sorted(jobs)
+
+def test_late_result_of_dead_worker_is_ignored(tmpdir, monkeypatch):
+    jobs = sweep.experiment_jobs(str(tmpdir), [2], 2, 5, seed = 3)
+    kill_first_attempt(monkeypatch, [0])
+    pool = sweep.WorkerPool(1, poll = 0.05)
+    pool.submit(jobs[:1], False, 'dead')
+    assert pool.wait() == [('dead', None)]
+    # As if the worker had reported back just before it was killed
+    pool.results.put((0, []))
+    pool.submit(jobs[1:], False, 'alive')
+    assert pool.wait() == [('alive', [])]
+
+def test_adaptive_sweep_retries_dead_worker(tmpdir, monkeypatch):
+    jobs = sweep.experiment_jobs(str(tmpdir), [2, 3], 4, 5, seed = 3)
+    kill_first_attempt(monkeypatch, [0])
+    (abandoned, allocations) = sweep.run_adaptive(jobs, 1e9, min_trials = 3, window = 2, workers = 2)
+    assert abandoned == []
+    # Any width is tight enough, so each configuration stops at min_trials
+    assert sorted(allocations) == ['2_bandits', '3_bandits']
+    assert all(allocation.finished() == 3 for allocation in allocations.values())
+    assert all(finished([job for job in jobs if job.trial == 0]))
@@ -0,0 +1,30 @@
+import pytest
+import experiment
+from tape import ActionTape
+from gridworld import GridWorld
+
+def test_replayed_run_matches_the_recorded_one(tmpdir):
+    (recorded, replayed) = (str(tmpdir.join('recorded.csv')), str(tmpdir.join('replayed.csv')))
+    experiment.run_experiment(recorded, 5, 10, seed = 6, save_tape = str(tmpdir.join('run.tape')))
+    tape = ActionTape.load(str(tmpdir.join('run.tape')))
+    assert tape.seed == 6
+    # The agents still draw from the seed, the bandits only from the tape
+    tape.seed = None
+    experiment.run_experiment(replayed, 5, 10, seed = 6, tape = tape)
+    assert tmpdir.join('recorded.csv').read() == tmpdir.join('replayed.csv').read()
+
+def test_tape_carries_on_from_the_seeded_stream():
+    world = GridWorld(num_bandits = 3, seed = 8)
+    [world.bandits[1].sample() for i in range(10)]
+    tape = ActionTape.from_worlds([world])
+    assert [len(a) for a in tape.actions] == [0, 10, 0]
+    replay = GridWorld(tape = tape)
+    original = GridWorld(num_bandits = 3, seed = 8)
+    for b in range(3):
+        assert [replay.bandits[b].sample() for i in range(3000)] == [original.bandits[b].sample() for i in range(3000)]
+    # Without a seed, a tape can't be extended
+    tape.seed = None
+    bandit = GridWorld(tape = tape).bandits[1]
+    [bandit.sample() for i in range(10)]
+    with pytest.raises(IndexError):
+        bandit.sample()
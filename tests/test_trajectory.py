@@ -0,0 +1,39 @@
+import numpy as np
+import tstd
+from gridworld import GridWorld, make_rng, AGENT_STREAM
+from trajectory import TrajectoryRecorder, load_trajectories
+
+def recorded_world(recorder_options):
+    agent = tstd.TSTDAgent(5, rng = make_rng(1, AGENT_STREAM, 0))
+    world = GridWorld(num_bandits = 5, agent = agent, seed = 1)
+    world.recorder = TrajectoryRecorder(world, **recorder_options)
+    return world
+
+def test_recorded_transitions_replay_the_episodes(tmpdir):
+    filename = str(tmpdir.join('run.traj'))
+    # A small buffer, so the file is written in many chunks
+    world = recorded_world({'filename': filename, 'capacity': 50})
+    scores = [world.play_episode() for ep in range(20)]
+    world.recorder.close()
+    t = load_trajectories(filename)
+    layout = world.layout
+    assert (t['next_state'] == layout.next_state[t['state'], t['action']]).all()
+    assert (t['reward'] == layout.reward[t['state'], t['action']]).all()
+    for ep in range(20):
+        moves = t[t['episode'] == ep]
+        assert moves['step'].tolist() == range(len(moves))
+        assert moves['state'][0] == layout.start
+        assert moves['reward'].sum() == scores[ep]
+        assert (moves['state'][1:] == moves['next_state'][:-1]).all()
+
+def test_ring_keeps_the_latest_transitions(tmpdir):
+    filename = str(tmpdir.join('all.traj'))
+    world = recorded_world({'filename': filename})
+    ring = recorded_world({'capacity': 50, 'ring': True})
+    for ep in range(20):
+        world.play_episode()
+        ring.play_episode()
+    world.recorder.close()
+    everything = load_trajectories(filename)
+    assert len(everything) > 50
+    assert (ring.recorder.transitions() == everything[-50:]).all()
@@ -0,0 +1,56 @@
+import numpy as np
+import vecworld
+from vecworld import VectorAgent, VectorGridWorld
+
+class FixedAgent(VectorAgent):
+    """
+    Always picks bandit 0, and records which worlds it is told about.
+    """
+    def episode_starting(self, states):
+        VectorAgent.episode_starting(self, states)
+        self.told = []
+
+    def get_bandit(self, idx):
+        return np.zeros(len(idx), dtype=int)
+
+    def set_state(self, idx, states):
+        VectorAgent.set_state(self, idx, states)
+        self.told.append(idx.copy())
+
+def test_worlds_stop_at_the_goal():
+    agent = FixedAgent(4, 3)
+    world = VectorGridWorld(4, num_bandits = 3, agent = agent, seed = 1)
+    # Bandit 0 always moves right in the first two worlds
+    world.first[:2,0] = 0
+    world.second[:2,0] = 1
+    scores = world.play_episode()
+    # Start, two open cells and the goal: 0 + 0 + 9
+    assert scores[:2].tolist() == [9, 9]
+    assert all(0 not in idx and 1 not in idx for idx in agent.told[3:])
+    assert (agent.state[:2] == world.layout.goal).all()
+
+def test_run_trials_writes_one_file_per_trial(tmpdir):
+    prefix = str(tmpdir.join('2_bandits'))
+    vecworld.run_trials(prefix, 3, 2, 5, seed = 4)
+    first = [tmpdir.join('2_bandits_{0}.csv'.format(t)).read() for t in range(3)]
+    for text in first:
+        lines = text.splitlines()
+        assert lines[0] == 'Episodes,TSTD(0),Q-Learning'
+        assert [int(line.split(',')[0]) for line in lines[1:]] == range(1, 6)
+    # The trials are independent, and a seed reproduces them
+    assert len(set(text.split('\n', 1)[1] for text in first)) == 3
+    vecworld.run_trials(prefix, 3, 2, 5, seed = 4)
+    assert [tmpdir.join('2_bandits_{0}.csv'.format(t)).read() for t in range(3)] == first
+def test_pulls_of_a_bandit_do_not_depend_on_other_worlds():
+    worlds = [VectorGridWorld(3, num_bandits = 4, seed = 2, block_size = 8) for i in range(2)]
+    pulls = [[], []]
+    rng = np.random.RandomState(0)
+    for step in range(40):
+        # The first world pulls bandit 1 of world 2 every step, the second
+        # only some of the time and among other pulls
+        pulls[0].append(worlds[0].sample(np.array([2]), np.array([1]))[0])
+        if rng.rand() < 0.5:
+            pulls[1].append(worlds[1].sample(np.array([0, 2]), np.array([3, 1]))[1])
+        else:
+            worlds[1].sample(np.array([1]), np.array([1]))
+    assert pulls[1] == pulls[0][:len(pulls[1])]
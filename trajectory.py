@@ -0,0 +1,152 @@
+"""
+Compact recording of every transition a GridWorld plays.
+
+A TrajectoryRecorder attached to a world keeps each transition as one row of
+a preallocated structured array:
+
+    episode, step, state, bandit, action, reward, next_state
+
+using the smallest integer types that fit the layout and the bandit count
+(e.g. two bytes per state on grids of up to 65536 cells, one byte per action
+and an int8 reward for the default rewards). The world hands over a whole
+episode at a time, so recording costs a few list appends per step and one
+bulk copy per episode.
+
+In streaming mode, the buffer is appended to a file as a gzip member every
+time it fills, and on flush or close. In ring mode, only the most recent
+capacity transitions are kept in memory, and they are written out only by
+save. Either kind of file is read back with load_trajectories.
+"""
+import io
+import gzip
+import numpy as np
+
+TRAJECTORY_SUFFIX = '.traj'
+
+def integer_type(low, high):
+    """
+    Returns the smallest integer type that holds every value in [low, high].
+    """
+    if low >= 0:
+        return np.min_scalar_type(high)
+    for dtype in [np.int8, np.int16, np.int32]:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+def transition_type(world):
+    """
+    Returns the record type of one transition in the given world.
+    """
+    layout = world.layout
+    state = integer_type(0, layout.num_states - 1)
+    if np.issubdtype(layout.reward.dtype, np.integer):
+        reward = integer_type(int(layout.reward.min()), int(layout.reward.max()))
+    else:
+        reward = np.float32
+    return np.dtype([('episode', np.uint32), ('step', integer_type(0, world.max_moves - 1)),
+                     ('state', state), ('bandit', integer_type(0, world.num_bandits - 1)),
+                     ('action', np.uint8), ('reward', reward), ('next_state', state)])
+
+class TrajectoryRecorder(object):
+    """
+    Records a world's transitions into a buffer of capacity rows. With ring,
+    the buffer keeps the latest transitions; otherwise it is flushed to
+    filename whenever it fills, replacing anything already in the file unless
+    append is set. Attach it by setting the world's recorder.
+    """
+    def __init__(self, world, filename = None, capacity = 2**16, ring = False, append = False):
+        if not ring and filename is None:
+            raise ValueError('A streaming trajectory recorder needs a filename')
+        if not ring and not append:
+            open(filename, 'wb').close()
+        self.filename = filename
+        self.ring = ring
+        self.buffer = np.zeros(capacity, dtype=transition_type(world))
+        # Rows in the buffer, and in ring mode the row the next transition goes in
+        self.size = 0
+        self.head = 0
+        self.episodes = 0
+        self.recorded = 0
+
+    def record_episode(self, states, bandits, actions, rewards):
+        """
+        Records one episode, given its n + 1 states and the n bandits, actions
+        and rewards of its moves.
+        """
+        n = len(bandits)
+        episode = self.episodes
+        self.episodes += 1
+        self.recorded += n
+        start = 0
+        while start < n:
+            if self.ring:
+                at = self.head
+                count = min(n - start, len(self.buffer) - at)
+            else:
+                if self.size == len(self.buffer):
+                    self.flush()
+                at = self.size
+                count = min(n - start, len(self.buffer) - at)
+            rows = self.buffer[at:at+count]
+            rows['episode'] = episode
+            rows['step'] = np.arange(start, start + count)
+            rows['state'] = states[start:start+count]
+            rows['bandit'] = bandits[start:start+count]
+            rows['action'] = actions[start:start+count]
+            rows['reward'] = rewards[start:start+count]
+            rows['next_state'] = states[start+1:start+count+1]
+            start += count
+            if self.ring:
+                self.head = (at + count) % len(self.buffer)
+                self.size = min(self.size + count, len(self.buffer))
+            else:
+                self.size += count
+
+    def transitions(self):
+        """
+        Returns the buffered transitions, oldest first.
+        """
+        if self.ring and self.size == len(self.buffer):
+            return np.concatenate((self.buffer[self.head:], self.buffer[:self.head]))
+        return self.buffer[:self.size].copy()
+
+    def flush(self):
+        """
+        Appends the buffered transitions to the file and empties the buffer.
+        Does nothing in ring mode.
+        """
+        if self.ring or self.size == 0:
+            return
+        write_trajectories(self.filename, self.buffer[:self.size], append = True)
+        self.size = 0
+
+    def save(self, filename = None):
+        """
+        Writes the buffered transitions of a ring recorder to a new file.
+        """
+        write_trajectories(filename or self.filename, self.transitions())
+
+    def close(self):
+        if self.ring:
+            if self.filename is not None:
+                self.save()
+        else:
+            self.flush()
+
+def write_trajectories(filename, transitions, append = False):
+    # Each write is a complete gzip member, so the file is valid between writes
+    f = gzip.open(filename, 'ab' if append else 'wb')
+    np.lib.format.write_array(f, transitions)
+    f.close()
+
+def load_trajectories(filename):
+    """
+    Reads every transition in a trajectory file, as one structured array.
+    """
+    f = io.BufferedReader(gzip.open(filename, 'rb'))
+    chunks = []
+    while f.peek(1):
+        chunks.append(np.lib.format.read_array(f))
+    f.close()
+    return np.concatenate(chunks) if chunks else np.zeros(0)
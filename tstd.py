@@ -1,6 +1,16 @@
-from itertools import product
-import random
+import numpy as np
 from gridworld import *
+from vecworld import VectorAgent
+from oracle import hull_bandits
+from banditindex import ThompsonIndex
+
+# Planning stops backing up states whose values move by less than this
+PLAN_TOLERANCE = 1e-3
+
+RESAMPLE_POLICIES = ['always', 'step', 'changed', 'interval', 'episode']
+
+# The policies that keep samples between steps, which an index can search
+INDEXED_POLICIES = ['changed', 'interval', 'episode']
 
 class TSTDAgent(Agent):
     """
@@ -8,88 +18,296 @@ class TSTDAgent(Agent):
     to minimize regret.
 
     TODO: How should Q-Learning be incorporated here?
+
+    With planning, the agent also plans with the layout's known transitions
+    and rewards under the posterior mean of every bandit, after every
+    plan_every steps or, if plan_every is 0, at the end of every episode.
+    Each backup is the TD(0) target with the posterior means in place of the
+    sampled bandits:
+
+        V(s) = max_k mean_k . (reward[s] + V(next_state[s]))
+
+    'sweep' backs up every state at once, up to plan_sweeps times or until
+    the values settle.
+
+    resample picks when the posterior of every bandit is sampled:
+
+        'always'    twice per step, once to pick a bandit and once for the
+                    TD(0) target
+        'step'      once per step, right after the pulled bandit's counts
+                    change, and reused for the next pick
+        'changed'   only the pulled bandit is resampled each step, and every
+                    bandit every resample_every steps, so a bandit with an
+                    unlucky sample still gets another chance
+        'interval'  every resample_every steps
+        'episode'   once per episode
+
+    With index, the bandit with the least regret is found with a
+    ThompsonIndex over the samples instead of a scan of every bandit. It picks
+    the same bandit, and only works with the policies that keep samples
+    between steps; with 'changed', resample_every should be in the hundreds
+    or more, as every full resample rebuilds the index.
     """
-    def __init__(self, num_bandits, alpha = 1, decrease_alpha = True):
-        Agent.__init__(self, num_bandits)
+    def __init__(self, num_bandits, alpha = 1, decrease_alpha = True, layout = None, rng = None,
+                 planning = None, plan_every = 0, plan_sweeps = 10, resample = 'always', resample_every = 10,
+                 index = False):
+        Agent.__init__(self, num_bandits, layout, rng)
         # Three values: UP, RIGHT, DOWN. We use a uniform prior.
-        self.priors = [[1,1,1] for x in range(num_bandits)]
+        self.priors = np.ones((num_bandits, 3))
         self.build_value_table()
         self.episodes = 0
         self.alpha = alpha
         self.decrease_alpha = decrease_alpha
         self.starting_alpha = alpha
+        if planning not in [None, 'sweep']:
+            raise ValueError('Unknown planning mode: {0}'.format(planning))
+        self.planning = planning
+        self.plan_every = plan_every
+        self.plan_sweeps = plan_sweeps
+        self.steps = 0
+        if resample not in RESAMPLE_POLICIES:
+            raise ValueError('Unknown resampling policy: {0}'.format(resample))
+        self.resample = resample
+        self.resample_every = resample_every
+        self.samples = None
+        self.pulls = 0
+        if index and resample not in INDEXED_POLICIES:
+            raise ValueError('An index needs samples kept between steps; use one of {0}'.format(
+                ', '.join(INDEXED_POLICIES)))
+        self.index = ThompsonIndex(num_bandits) if index else None
 
-    def sample_dirichlet(self, prior):
-        sample = [random.gammavariate(a,1) for a in prior]
-        sample = [v/sum(sample) for v in sample]
-        return sample
+    def sample_dirichlet(self):
+        """
+        Draws one sample from every bandit's Dirichlet posterior at once.
+        Returns a (num_bandits, 3) array whose rows sum to one.
+        """
+        samples = self.rng.gamma(self.priors)
+        samples /= samples.sum(axis=1, keepdims=True)
+        return samples
 
     def build_value_table(self):
-        self.v = {}
-        for state in product(range(GRID_WIDTH), range(GRID_HEIGHT)):
-            self.v[state] = 0
+        self.v = np.zeros(self.layout.num_states)
+        # Per-state cache of action values and regret gaps. A state's entry
+        # is valid while its cached version matches its current version,
+        # which is bumped whenever the value of one of its successors changes.
+        self.q_cache = np.zeros((self.layout.num_states, 3))
+        self.gap_cache = np.zeros((self.layout.num_states, 3))
+        self.version = np.zeros(self.layout.num_states, dtype=int)
+        self.cached_version = np.full(self.layout.num_states, -1, dtype=int)
+
+    def posterior_sample(self):
+        """
+        Returns the sample of every bandit's posterior that the next decision
+        uses, drawing a new one when the resampling policy calls for it.
+        """
+        if self.resample == 'always' or self.samples is None:
+            self.samples = self.sample_dirichlet()
+            if self.index is not None:
+                self.index.rebuild(self.samples)
+        return self.samples
+
+    def posterior_changed(self, bandit):
+        """
+        Applies the resampling policy after a pull of bandit.
+        """
+        self.pulls += 1
+        if self.resample == 'step':
+            self.samples = None
+        elif self.resample in ['changed', 'interval'] and self.pulls % self.resample_every == 0:
+            self.samples = None
+        elif self.resample == 'changed' and self.samples is not None:
+            row = self.rng.gamma(self.priors[bandit])
+            self.samples[bandit] = row / row.sum()
+            if self.index is not None:
+                self.index.changed(bandit)
 
     def episode_starting(self, state):
         self.state = state
         self.prev_state = None
+        if self.resample == 'episode':
+            self.samples = None
         
     def episode_over(self):
         self.episodes += 1
         if self.decrease_alpha:
             self.alpha = min(self.starting_alpha, 20.0 / float(self.episodes+1))
+        if self.planning and not self.plan_every:
+            self.plan()
 
     def get_bandit(self):
         return self.thompson_sampling()[0]
 
     def thompson_sampling(self):
-        samples = [self.sample_dirichlet(prior) for prior in self.priors]
-        regret = [self.calc_regret(sample) for sample in samples]
-        maxi = 0
-        for i in range(self.num_bandits):
-            if regret[i] < regret[maxi]:
-                maxi = i
+        samples = self.posterior_sample()
+        if self.index is not None:
+            maxi = self.index.best(self.action_gaps())
+        else:
+            maxi = samples.dot(self.action_gaps()).argmin()
         self.prev_bandit = maxi
         return (maxi,samples[maxi])
 
-    def calc_regret(self, bandit):
+    def action_values(self):
+        """
+        Returns the value of taking each action in the current state
+        """
+        self.refresh_cache(self.state)
+        return self.q_cache[self.state]
+
+    def action_gaps(self):
+        """
+        Returns the regret of taking each action in the current state. The
+        regret of a bandit is its action distribution dotted with this vector.
+        """
+        self.refresh_cache(self.state)
+        return self.gap_cache[self.state]
+
+    def mean_policy(self):
         """
-        Calculates the regret of choosing this bandit
+        Returns the (num_states, num_bandits) policy that picks the bandit
+        with the least regret under the posterior mean of every bandit's
+        action distribution.
         """
-        srup = REWARDS[(self.state,UP)]
-        srright = REWARDS[(self.state,RIGHT)]
-        srdown = REWARDS[(self.state,DOWN)]
-        qup = srup[1] + self.v[srup[0]]
-        qright = srright[1] + self.v[srright[0]]
-        qdown = srdown[1] + self.v[srdown[0]]
-        qmax = max(qup, qright, qdown)
-        regret = bandit[UP] * (qmax - qup)
-        regret += bandit[RIGHT] * (qmax - qright)
-        regret += bandit[DOWN] * (qmax - qdown)
-        return regret
+        means = self.priors / self.priors.sum(axis=1, keepdims=True)
+        q = self.layout.reward + self.v[self.layout.next_state]
+        regret = (q.max(axis=1)[:,None] - q).dot(means.T)
+        policy = np.zeros((self.layout.num_states, self.num_bandits))
+        policy[np.arange(self.layout.num_states), regret.argmin(axis=1)] = 1
+        return policy
+
+    def refresh_cache(self, state):
+        if self.cached_version[state] != self.version[state]:
+            q = self.layout.reward[state] + self.v[self.layout.next_state[state]]
+            self.q_cache[state] = q
+            self.gap_cache[state] = q.max() - q
+            self.cached_version[state] = self.version[state]
+
+    def set_value(self, state, value):
+        """
+        Sets the value of a state and invalidates the cached action values of
+        every state that can transition into it.
+        """
+        if value != self.v[state]:
+            self.v[state] = value
+            self.version[self.layout.predecessors(state)] += 1
 
     def set_state(self, state):
         # First we need to update the value for the previous state.
         self.update_v()
         self.prev_state = self.state
         self.state = state
+        self.steps += 1
+        if self.planning and self.plan_every and self.steps % self.plan_every == 0:
+            self.plan()
 
     def update_v(self):
         # We've updated our priors on bandits, so we need to know what our new min-regret bandit is
         bandit = self.thompson_sampling()[1]
-        srup = REWARDS[(self.state,UP)]
-        srright = REWARDS[(self.state,RIGHT)]
-        srdown = REWARDS[(self.state,DOWN)]
-        val =  bandit[UP]*(self.v[srup[0]]+srup[1])
-        val += bandit[RIGHT]*(self.v[srright[0]]+srright[1])
-        val += bandit[DOWN]*(self.v[srdown[0]]+srdown[1])
-        self.v[self.state] = (1.0-self.alpha) * self.v[self.state] + self.alpha * val
+        val = bandit.dot(self.action_values())
+        self.set_value(self.state, (1.0-self.alpha) * self.v[self.state] + self.alpha * val)
+
+    def plan(self):
+        # Only bandits on the hull of the posterior means can win a backup
+        means = self.priors / self.priors.sum(axis=1, keepdims=True)
+        self.sweep(means[hull_bandits(means)])
+
+    def sweep(self, means):
+        """
+        Backs up every state at once until no value moves by more than
+        PLAN_TOLERANCE, or for plan_sweeps sweeps.
+        """
+        goal = self.layout.goal
+        for i in range(self.plan_sweeps):
+            q = self.layout.reward + self.v[self.layout.next_state]
+            v = q.dot(means.T).max(axis=1)
+            v[goal] = self.v[goal]
+            changed = v != self.v
+            if not changed.any():
+                break
+            error = np.abs(v - self.v).max()
+            self.v = v
+            # Invalidate every state with a successor whose value changed
+            self.version[changed[self.layout.next_state].any(axis=1)] += 1
+            if error <= PLAN_TOLERANCE:
+                break
 
     def observe_action(self, action):
-        self.priors[self.prev_bandit][action] += 1
+        self.priors[self.prev_bandit,action] += 1
         self.prev_action = action
+        self.posterior_changed(self.prev_bandit)
 
     def observe_reward(self, r):
         self.prev_reward = r
 
+    def stats(self):
+        return {'alpha': self.alpha}
+
+class VectorTSTDAgent(VectorAgent):
+    """
+    A population of independent TSTD agents, one per world. The priors are
+    stored as a (num_worlds, num_bandits, 3) array and the value tables as a
+    (num_worlds, num_states) array.
+    """
+    def __init__(self, num_worlds, num_bandits, alpha = 1, decrease_alpha = True, layout = None, rng = None):
+        VectorAgent.__init__(self, num_worlds, num_bandits, layout, rng)
+        # Three values: UP, RIGHT, DOWN. We use a uniform prior.
+        self.priors = np.ones((num_worlds, num_bandits, 3))
+        self.v = np.zeros((num_worlds, self.layout.num_states))
+        self.prev_bandit = np.zeros(num_worlds, dtype=int)
+        self.episodes = 0
+        self.alpha = alpha
+        self.decrease_alpha = decrease_alpha
+        self.starting_alpha = alpha
 
+    def episode_over(self):
+        self.episodes += 1
+        if self.decrease_alpha:
+            self.alpha = min(self.starting_alpha, 20.0 / float(self.episodes+1))
+
+    def get_bandit(self, idx):
+        return self.thompson_sampling(idx)[0]
+
+    def action_values(self, idx):
+        """
+        Returns the (len(idx), 3) array of one-step action values in the
+        current state of each world.
+        """
+        states = self.state[idx]
+        return self.layout.reward[states] + self.v[idx[:,None], self.layout.next_state[states]]
+
+    def thompson_sampling(self, idx):
+        samples = self.rng.gamma(self.priors[idx])
+        samples /= samples.sum(axis=2, keepdims=True)
+        q = self.action_values(idx)
+        gap = q.max(axis=1, keepdims=True) - q
+        regret = np.einsum('nka,na->nk', samples, gap)
+        maxi = regret.argmin(axis=1)
+        self.prev_bandit[idx] = maxi
+        return (maxi, samples[np.arange(len(idx)), maxi])
+
+    def mean_policy(self):
+        """
+        Returns the (num_worlds, num_states, num_bandits) posterior-mean
+        policy of every world, as in TSTDAgent.mean_policy.
+        """
+        means = self.priors / self.priors.sum(axis=2, keepdims=True)
+        q = self.layout.reward + self.v[:, self.layout.next_state]
+        regret = np.matmul(q.max(axis=2)[:,:,None] - q, means.transpose(0, 2, 1))
+        (n, s) = np.ogrid[:self.num_worlds, :self.layout.num_states]
+        policy = np.zeros(regret.shape)
+        policy[n, s, regret.argmin(axis=2)] = 1
+        return policy
+
+    def set_state(self, idx, states):
+        # First we need to update the value for the previous state.
+        self.update_v(idx)
+        self.state[idx] = states
+
+    def update_v(self, idx):
+        # We've updated our priors on bandits, so we need to know what our new min-regret bandit is
+        bandit = self.thompson_sampling(idx)[1]
+        val = (bandit * self.action_values(idx)).sum(axis=1)
+        states = self.state[idx]
+        self.v[idx, states] = (1.0-self.alpha) * self.v[idx, states] + self.alpha * val
 
+    def observe_action(self, idx, actions):
+        self.priors[idx, self.prev_bandit[idx], actions] += 1
@@ -0,0 +1,191 @@
+"""
+A vectorized engine for the Multi-Armed Bandit Grid World.
+
+Rather than moving one agent through one world, a VectorGridWorld holds N
+independent worlds as NumPy arrays and steps all of them in lockstep. Each
+world has its own set of bandits, so every world is an independent trial of
+the scalar GridWorld. Worlds that reach the goal are masked out for the rest
+of the episode.
+
+Population agents extend VectorAgent. They mirror the Agent interface, but
+every call is given `idx`, the indices of the worlds that are still active,
+and works on arrays with one entry per world in `idx`.
+"""
+import csv
+import argparse
+import numpy as np
+from gridworld import *
+
+class VectorAgent(object):
+    """
+    An abstract base class that population agents must extend.
+
+    A population agent holds one learner per world, with all of its tables
+    stacked along a leading axis of length num_worlds.
+    """
+    def __init__(self, num_worlds, num_bandits, layout = None, rng = None):
+        self.num_worlds = num_worlds
+        self.num_bandits = num_bandits
+        self.layout = layout if layout is not None else build_layout()
+        self.rng = rng if rng is not None else np.random.mtrand._rand
+
+    def episode_starting(self, states):
+        self.state = states.copy()
+
+    def episode_over(self):
+        pass
+
+    def get_bandit(self, idx):
+        pass
+
+    def set_state(self, idx, states):
+        self.state[idx] = states
+
+    def observe_action(self, idx, actions):
+        pass
+
+    def observe_reward(self, idx, r):
+        pass
+
+class VectorGridWorld(object):
+    """
+    N independent grid worlds. As with GridWorld, every bandit of every world
+    draws its actions from its own stream, block_size at a time, so the n-th
+    pull of a bandit has the same outcome whichever agent makes it and
+    whenever it is made. Vector worlds built with the same seed have the same
+    bandits and outcomes.
+    """
+    def __init__(self, num_worlds, max_moves = 100, num_bandits = 20, agent = None, layout = None, seed = None,
+                 block_size = 256):
+        self.num_worlds = num_worlds
+        self.max_moves = max_moves
+        self.num_bandits = num_bandits
+        self.agent = agent
+        self.layout = layout if layout is not None else build_layout()
+        self.seed = seed
+        # Each world gets its own bandits, drawn the same way as Bandit()
+        rng = make_rng(seed, WORLD_STREAM)
+        partition1 = rng.random_sample((num_worlds, num_bandits))
+        partition2 = rng.random_sample((num_worlds, num_bandits))
+        self.first = np.minimum(partition1, partition2)
+        self.second = np.maximum(partition1, partition2)
+        # The next block_size actions of every bandit, and how many of them
+        # have been handed out. Streams are made on a bandit's first pull.
+        self.block_size = block_size
+        self.blocks = np.zeros((num_worlds, num_bandits, block_size), dtype=np.uint8)
+        self.pos = np.full((num_worlds, num_bandits), block_size, dtype=int)
+        self.action_rngs = {}
+
+    def action_probabilities(self):
+        """
+        Returns the (num_worlds, num_bandits, 3) UP, RIGHT and DOWN
+        probabilities of every bandit.
+        """
+        return np.stack((self.first, self.second - self.first, 1 - self.second), axis=-1)
+
+    def sample(self, idx, bidx):
+        """
+        Samples one action from bandit bidx[i] of world idx[i] for every i.
+        """
+        used = self.pos[idx, bidx] == self.block_size
+        for (w, b) in zip(idx[used], bidx[used]):
+            self.next_block(w, b)
+        actions = self.blocks[idx, bidx, self.pos[idx, bidx]].astype(int)
+        self.pos[idx, bidx] += 1
+        return actions
+
+    def next_block(self, world, bandit):
+        if (world, bandit) not in self.action_rngs:
+            self.action_rngs[(world, bandit)] = (make_rng(self.seed, ACTION_STREAM, world, bandit)
+                                                 if self.seed is not None else None)
+        rng = self.action_rngs[(world, bandit)] or np.random.mtrand._rand
+        self.blocks[world, bandit] = sample_actions(rng, self.first[world, bandit], self.second[world, bandit],
+                                                    self.block_size)
+        self.pos[world, bandit] = 0
+
+    def play_episode(self):
+        states = np.full(self.num_worlds, self.layout.start, dtype=int)
+        active = np.ones(self.num_worlds, dtype=bool)
+        total_reward = np.zeros(self.num_worlds, dtype=self.layout.reward.dtype)
+        self.agent.episode_starting(states)
+        for i in range(self.max_moves):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+            bidx = self.agent.get_bandit(idx)
+            assert(np.all(bidx >= 0))
+            assert(np.all(bidx < self.num_bandits))
+            actions = self.sample(idx, bidx)
+            self.agent.observe_action(idx, actions)
+            r = self.layout.reward[states[idx], actions]
+            total_reward[idx] += r
+            self.agent.observe_reward(idx, r)
+            states[idx] = self.layout.next_state[states[idx], actions]
+            self.agent.set_state(idx, states[idx])
+            active[idx] = states[idx] != self.layout.goal
+        self.agent.episode_over()
+        return total_reward
+
+def run_trials(prefix, trials, bandits, episodes, layout = None, seed = None, eval_interval = 1, eval_tstd = False,
+               progress = False):
+    """
+    Runs every trial of one experiment in a single process and writes one
+    CSV per trial, named <prefix>_<trial>.csv, in the same format as
+    experiment.py. Policies are evaluated exactly as in experiment.py, for
+    all trials at once. Both agents play worlds built from the same seed, so
+    they see the same bandits and outcomes; an unseeded run picks its seed at
+    random and prints it. With progress, every tenth episode number is printed.
+    """
+    import tstd
+    import qlearning
+    import oracle
+    if layout is None:
+        layout = build_layout()
+    if seed is None:
+        # Both agents' worlds need the same bandits and outcomes
+        seed = np.random.randint(2**31)
+        print 'Seed: {0}'.format(seed)
+    agents = [tstd.VectorTSTDAgent(trials, bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 0)),
+              qlearning.VectorQAgent(trials, bandits, layout = layout, rng = make_rng(seed, AGENT_STREAM, 1))]
+    worlds = [VectorGridWorld(trials, num_bandits = bandits, agent = agent, layout = layout, seed = seed)
+              for agent in agents]
+    series = ['Episodes', 'TSTD(0)', 'Q-Learning']
+    scores = np.zeros((episodes, trials, len(agents)))
+    evaluations = [None for _ in agents]
+    for ep in range(episodes):
+        if progress and ep % 10 == 0:
+            print ep
+        for i,(world,agent) in enumerate(zip(worlds, agents)):
+            score = world.play_episode()
+            if i == 1 or eval_tstd:
+                if ep % eval_interval == 0:
+                    policy = agent.greedy_policy() if i == 1 else agent.mean_policy()
+                    moves = oracle.policy_moves(policy, world.action_probabilities())
+                    evaluations[i] = oracle.evaluate_policy(layout, moves, world.max_moves)[:, layout.start]
+                score = evaluations[i]
+            scores[ep,:,i] = score
+    for trial in range(trials):
+        f = open('{0}_{1}.csv'.format(prefix, trial), 'wb')
+        writer = csv.writer(f)
+        writer.writerow(series)
+        for ep in range(episodes):
+            writer.writerow([ep + 1] + scores[ep,trial].tolist())
+        f.flush()
+        f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Runs every trial of an experiment in lockstep.')
+    parser.add_argument('prefix', help = 'Results are written to <prefix>_<trial>.csv')
+    parser.add_argument('trials', type = int)
+    parser.add_argument('bandits', type = int)
+    parser.add_argument('episodes', type = int)
+    parser.add_argument('--layout', help = 'ASCII layout spec file')
+    parser.add_argument('--seed', type = int, help = 'Trial seed (default: chosen at random and printed)')
+    parser.add_argument('--eval-interval', type = int, default = 1, help = 'Episodes between exact policy evaluations')
+    parser.add_argument('--eval-tstd', action = 'store_true',
+                        help = 'Score TSTD(0) by its posterior-mean policy rather than the episode it played')
+    parser.add_argument('--progress', action = 'store_true', help = 'Print every tenth episode number')
+    args = parser.parse_args()
+    layout = load_layout(args.layout) if args.layout else None
+    run_trials(args.prefix, args.trials, args.bandits, args.episodes, layout, args.seed, args.eval_interval,
+               args.eval_tstd, args.progress)